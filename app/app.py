@@ -2,18 +2,16 @@ import plotly.graph_objects as go
 import streamlit as st
 import pandas as pd
 import numpy as np
-import sqlite3
 import json
-import time
 import sys
 import os
-import io
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from modules.pdf_export import generate_pdf_report
 from datetime import datetime, timedelta
-from modules import auto_update, indicators
-from modules.db_utils import get_symbols, get_price_data, load_data, save_user_preference
-from modules.plot_utils import plot_price_volume
+from modules import indicators, indicator_store, data_cache, risk, export_jobs
+from modules.data_cache import get_symbols, get_earliest_date, get_price_data, get_price_bars, get_indicators, get_close_panel, get_pairwise_moments
+from modules.db_utils import BAR_LABELS, choose_bar_level
+from modules.db_utils import save_user_preference
+from modules.plot_utils import DEFAULT_WIDTH_PX, plot_price_volume, line_trace, selected_x_range
 
 if "compare_mode" not in st.session_state:
     st.session_state.compare_mode = False
@@ -21,7 +19,7 @@ if "compare_mode" not in st.session_state:
 st.set_page_config("📈 金融資料視覺化", layout="wide")
 st.sidebar.title("📌 選擇條件")
 
-DB_PATH = 'data/finance_data.db'
+INDICATOR_LOOKBACK_DAYS = 120  # 比較模式計算指標時往前多讀的天數（MA60 / MACD 暖身）
 type_mapping = {
     'stock': '股價',
     'currency': '匯率',
@@ -31,6 +29,42 @@ type_mapping = {
     'bond': '債券',
 }
 
+
+def show_price_chart(plot_df, title, key, loader=None):
+    """
+    顯示（必要時降採樣的）價格圖；使用者框選一段日期後，在下方以該區間的完整解析度資料重畫。
+    loader(start, end) 回傳區間內的日資料；未提供時直接切出 plot_df 的區間。
+    """
+    event = st.plotly_chart(plot_price_volume(plot_df, title=title, width_px=chart_width), use_container_width=True,
+                            on_select="rerun", selection_mode="box", key=key)
+    zoom = selected_x_range(event)
+    if zoom is None:
+        return
+    if loader is not None:
+        detail = loader(*zoom)
+    else:
+        dates = pd.to_datetime(plot_df["date"])
+        detail = plot_df[(dates >= zoom[0]) & (dates <= zoom[1])]
+    if detail.empty:
+        st.info("ℹ️ 框選區間內沒有資料")
+    else:
+        st.plotly_chart(plot_price_volume(detail, title=f"{title}（{zoom[0]:%Y-%m-%d} ~ {zoom[1]:%Y-%m-%d}）",
+                                          width_px=chart_width),
+                        use_container_width=True)
+
+
+def daily_loader(symbol_id, currency=None):
+    """框選區間用：依區間查詢日資料，currency 指定時把收盤價換算成該幣別"""
+    def load(start, end):
+        daily = get_price_data(symbol_id, start.date(), end.date())[["date", "close", "volume"]].copy()
+        if currency is not None:
+            daily["close"] = fx_converter.convert(daily["close"], daily["date"], native_currency, currency)
+        return daily.dropna(subset=["close"])
+    return load
+
+
+# 每次 rerun 先確認資料版本，有新寫入的標的會自動讓快取失效
+data_cache.refresh_versions()
 symbols_df = get_symbols()
 symbols_df['type_cn'] = symbols_df['type'].map(type_mapping)
 
@@ -45,16 +79,22 @@ selected = st.sidebar.selectbox(
 )
 
 today = datetime.today().date()
-default_start = today - timedelta(days=180)
-start_date = st.sidebar.date_input("起始日期", default_start)
-end_date = st.sidebar.date_input("結束日期", today)
+# 日期下限設為資料庫最早的日期（Streamlit 預設只能往前選約 10 年，長區間的月 K 會選不到）
+earliest_date = get_earliest_date() or today - timedelta(days=180)
+default_start = max(today - timedelta(days=180), earliest_date)
+start_date = st.sidebar.date_input("起始日期", default_start, min_value=earliest_date, max_value=today)
+end_date = st.sidebar.date_input("結束日期", today, min_value=earliest_date, max_value=today)
 
 pricing_currency = st.sidebar.radio("計價幣別", ["台幣計價", "美元計價"])
 if pricing_currency == "台幣計價":
     converted_currency = "TWD"
 else:
     converted_currency = "USD"
-    
+
+# 圖表寬度決定降採樣保留的點數（Streamlit 無法取得瀏覽器實際寬度，由使用者依螢幕調整）
+chart_width = st.sidebar.number_input("圖表寬度（像素）", min_value=300, max_value=4000,
+                                      value=DEFAULT_WIDTH_PX, step=100)
+
 if st.sidebar.button("📈 多標的比較"):
     st.session_state.compare_mode = True
 
@@ -69,19 +109,19 @@ with st.sidebar.popover("💾 匯出設定(單一標的)"):
     export_btn = st.button("確認匯出")
 
         
-df = get_price_data(selected.id, start_date, end_date)
+# 區間較長時改讀預先彙總的週 / 月 K，圖表點數維持在可呈現的範圍
+bar_level = choose_bar_level(start_date, end_date)
+df = get_price_bars(selected.id, start_date, end_date, bar_level)
 aapl_df = df[["date", "close", "volume"]].copy()
 
 # print(symbols_df["symbol"].unique())  # 看有哪些 symbol
 # print(symbols_df[symbols_df["symbol"] == "USDTWD=X"])
 
 symbols_df["symbol"] = symbols_df["symbol"].str.strip()
-usdtwd_id = symbols_df[symbols_df["symbol"] == "USDTWD=X"]["id"].values[0]
-# print(usdtwd_id)
-# print(type(usdtwd_id))
 
-usd_twd_df = get_price_data(int(usdtwd_id), start_date, end_date)
-# print(usd_twd_df)
+# 匯率換算：依價格日期對齊當日（或之前最近一筆）匯率
+fx_converter = data_cache.get_fx_converter()
+native_currency = selected.currency or {"US": "USD", "JP": "JPY"}.get(selected.region, "TWD")
 
 if not st.session_state.compare_mode:
     st.title(f"📊 {selected.name} ({selected.symbol}) 歷史走勢")
@@ -104,10 +144,12 @@ if not st.session_state.compare_mode:
 
     st.markdown(f"**市場地區**：{region_label.get(selected.region, selected.region)}")
     st.markdown(f"**資料類型**：{type_desc.get(selected.type, selected.type)}")
+    if bar_level != "D":
+        st.caption(f"📅 區間較長，以{BAR_LABELS[bar_level]}顯示（共 {len(df)} 筆），框選區間可檢視日資料")
 
     if selected.region == "US" and selected.type == "stock":
         
-        st.plotly_chart(plot_price_volume(df, title=selected.name), use_container_width=True)
+        show_price_chart(df, selected.name, key="price_chart_usd", loader=daily_loader(selected.id))
 
         symbol_name = selected.name or selected.symbol
         price_col_name = f"{symbol_name}_usd"
@@ -117,25 +159,13 @@ if not st.session_state.compare_mode:
         if "volume" in aapl_df.columns:
             aapl_df.rename(columns={"volume": volume_col_name}, inplace=True)
         
-        # ✅ 嘗試從 close / adj_close 擷取匯率欄位
-        usd_twd_df.columns = [col.lower() for col in usd_twd_df.columns]  # 欄位轉小寫
-        
-        if "adj_close" in usd_twd_df.columns:
-            usd_twd_df.rename(columns={"adj_close": "usd_to_twd"}, inplace=True)
-        elif "close" in usd_twd_df.columns:
-            usd_twd_df.rename(columns={"close": "usd_to_twd"}, inplace=True)
-        else:
-            st.warning("⚠️ 無法找到 USD/TWD 匯率欄位（adj_close 或 close），請確認資料格式正確")
-            st.write("⚠️ 匯率資料欄位為：", usd_twd_df.columns.tolist())
-            usd_twd_df = pd.DataFrame(columns=["date", "usd_to_twd"])  # 保持 merge 時不會報錯
-
         # ✅ 標準化日期格式
         aapl_df['date'] = pd.to_datetime(aapl_df['date']).dt.date
-        usd_twd_df['date'] = pd.to_datetime(usd_twd_df['date']).dt.date
-        
-        merged = pd.merge(aapl_df, usd_twd_df, on="date", how="left")
 
-        merged[f"{symbol_name}_twd"] = merged[price_col_name] * merged["usd_to_twd"]
+        # ✅ 以日期對齊的匯率換算台幣價格
+        merged = aapl_df.copy()
+        merged["usd_to_twd"] = fx_converter.rates("USD", "TWD", merged["date"])
+        merged[f"{symbol_name}_twd"] = fx_converter.convert(merged[price_col_name], merged["date"], native_currency, "TWD")
     
         # 中文資料表
         merged_zh = merged[["date", price_col_name, "usd_to_twd", f"{symbol_name}_twd"]].copy()
@@ -161,8 +191,8 @@ if not st.session_state.compare_mode:
         if plot_df.empty:
             st.warning("⚠️ 無法顯示圖表：股價或匯率資料可能缺失，請確認資料是否齊全。")
         else:
-            fig_twd = plot_price_volume(plot_df, title=f" {symbol_name} 台幣計價")
-            st.plotly_chart(fig_twd, use_container_width=True)
+            show_price_chart(plot_df, f" {symbol_name} 台幣計價", key="price_chart_twd",
+                             loader=daily_loader(selected.id, "TWD"))
     
         # 顯示表格
         st.subheader(f"📋 {symbol_name} 計價資料預覽")
@@ -185,26 +215,11 @@ if not st.session_state.compare_mode:
         
         # st.write("symbols_df columns", symbols_df.columns.tolist())
 
-        # 對欄位標準化與匯率表處理
-        usd_twd_df.columns = [col.lower() for col in usd_twd_df.columns]
-        if "adj_close" in usd_twd_df.columns:
-            usd_twd_df.rename(columns={"adj_close": "usd_to_twd"}, inplace=True)
-        elif "close" in usd_twd_df.columns:
-            usd_twd_df.rename(columns={"close": "usd_to_twd"}, inplace=True)
-        else:
-            st.warning("⚠️ 無法找到 USD/TWD 匯率欄位")
-            usd_twd_df = pd.DataFrame(columns=["date", "usd_to_twd"])
-        
-        # 時間欄位標準化
-        usd_twd_df["date"] = pd.to_datetime(usd_twd_df["date"]).dt.date
-        aapl_df["date"] = pd.to_datetime(aapl_df["date"]).dt.date
-        
-        # 合併資料
-        merged = pd.merge(aapl_df, usd_twd_df, on="date", how="left")
-        
-        # 統一處理價格與成交量欄位名稱
-        merged["price_twd"] = merged[price_col_name]
-        merged["price_usd"] = merged["price_twd"] / merged["usd_to_twd"]
+        # 以日期對齊的匯率，由原始幣別換算台幣與美元價格
+        merged = aapl_df.copy()
+        merged["usd_to_twd"] = fx_converter.rates("USD", "TWD", merged["date"])
+        merged["price_twd"] = fx_converter.convert(merged[price_col_name], merged["date"], native_currency, "TWD")
+        merged["price_usd"] = fx_converter.convert(merged[price_col_name], merged["date"], native_currency, "USD")
         
         if volume_col_name in merged.columns:
             merged[volume_col_name] = pd.to_numeric(merged[volume_col_name], errors="coerce")
@@ -231,8 +246,8 @@ if not st.session_state.compare_mode:
         if plot_df.empty:
             st.warning("⚠️ 無法顯示圖表：資料可能缺失")
         else:
-            fig = plot_price_volume(plot_df, title=f"{symbol_name}（{currency_label}）")
-            st.plotly_chart(fig, use_container_width=True)
+            show_price_chart(plot_df, f"{symbol_name}（{currency_label}）", key="price_chart_converted",
+                             loader=daily_loader(selected.id, converted_currency))
         
         # 顯示資料表格
         merged_zh = merged[["date", price_col, "usd_to_twd"]].copy()
@@ -253,15 +268,16 @@ if not st.session_state.compare_mode:
 #            計算指標
 # -----------------------------------
 
-df_ind = load_data(selected.symbol)
+# MA5/20/60、RSI14 與 MACD(12) 已預先計算並存於 price_indicators
+df_ind = get_indicators(selected.id)
 ma_window = st.sidebar.selectbox("MA 期數", [5, 20, 60], index=1)
 macd_window = st.sidebar.selectbox("MACD 期數", [9, 12, 26], index=1)
+rolling_window = st.sidebar.selectbox("滾動視窗（交易日）", [20, 60, 120, 252], index=1)
 
 
 if not df_ind.empty:
-    df_ind = indicators.calculate_ma(df_ind, window=ma_window)
-    df_ind = indicators.calculate_rsi(df_ind, length=14)
-    df_ind = indicators.calculate_macd(df_ind, base_period=macd_window)
+    if macd_window != indicator_store.MACD_BASE:
+        df_ind = indicators.calculate_macd(df_ind, base_period=macd_window)
 
     ma_col = f'MA{ma_window}'
     rsi_col = "rsi14"
@@ -272,25 +288,12 @@ if not df_ind.empty:
 
     # --- 新增：計算報酬率指標 ---
 
-    # 只要有收盤價 close 就能算，這裡用 df_ind 的 close
-    df_ind = df_ind.dropna(subset=['close']).copy()
-    df_ind['return'] = df_ind['close'].pct_change()
-
-    # 累積報酬率
-    cumulative_return = (1 + df_ind['return']).prod() - 1
-
-    # 年化報酬率 (假設一年252交易日)
-    total_days = (df_ind['date'].max() - df_ind['date'].min()).days
-    annualized_return = (1 + cumulative_return) ** (252 / total_days) - 1 if total_days > 0 else np.nan
-
-    # 年化波動率
-    annualized_volatility = df_ind['return'].std() * np.sqrt(252)
-
-    # 計算最大回落 (MDD)
-    cumulative = (1 + df_ind['return']).cumprod()
-    rolling_max = cumulative.cummax()
-    drawdown = (cumulative - rolling_max) / rolling_max
-    max_drawdown = drawdown.min()
+    # 以 risk 模組的統一公式計算（年化以交易期數為準）
+    stats = risk.summarize(risk.returns_from_prices(df_ind.set_index('date')['close'])).iloc[0]
+    cumulative_return = stats["cumulative_return"]
+    annualized_return = stats["annualized_return"]
+    annualized_volatility = stats["annualized_volatility"]
+    max_drawdown = stats["max_drawdown"]
 
     # 將結果整理成 DataFrame 方便繪圖
     stats_df = pd.DataFrame({
@@ -317,6 +320,20 @@ if not df_ind.empty:
 
     st.plotly_chart(fig_stats, use_container_width=True)
 
+    # --- 滾動風險指標 ---
+    rolling = risk.rolling_summary(
+        risk.returns_from_prices(df_ind.set_index('date')['close']), window=rolling_window
+    )
+    rolling_df = pd.DataFrame({
+        "滾動波動率": rolling["rolling_volatility"].iloc[:, 0],
+        "滾動夏普比率": rolling["rolling_sharpe"].iloc[:, 0],
+        "滾動最大回落": rolling["rolling_max_drawdown"].iloc[:, 0],
+    }).dropna(how='all')
+
+    st.subheader(f"📉 滾動風險指標（{rolling_window} 日）")
+    st.line_chart(rolling_df[["滾動波動率", "滾動最大回落"]])
+    st.line_chart(rolling_df[["滾動夏普比率"]])
+
 else:
     st.warning("⚠️ 查無資料，請確認資料庫中是否有該標的歷史資料。")
 
@@ -324,63 +341,17 @@ else:
 #            儲存 Json & SQLite
 # -----------------------------------
 
-# 1. 取得價格資料與匯率資料
-df = get_price_data(selected.id, start_date, end_date)
-df_fx = get_price_data(int(usdtwd_id), start_date, end_date)
-
-# 2. 日期轉換（確保一致性）
-df["date"] = pd.to_datetime(df["date"]).dt.normalize()  
-df_fx["date"] = pd.to_datetime(df_fx["date"]).dt.normalize()  
-
-# 3. 保留匯率欄位並改名
-df = df.dropna(subset=["close"])
-df_fx = df_fx[["date", "close"]].rename(columns={"close": "usd_to_twd"})
-
-# 4. 合併資料（left join，把匯率接到 df 上）
-df_merged = pd.merge(df, df_fx, on="date", how="left")
-
-# 5. 設定 index
-df.set_index("date", inplace=True)
-
-# 計算報酬率與統計
-daily_returns = df["close"].pct_change().dropna()
-
-acc_return = indicators.cumulative_return(daily_returns)
-annual_return = indicators.annualized_return(daily_returns)
-volatility = indicators.annualized_volatility(daily_returns)
-mdd = indicators.max_drawdown(daily_returns)
-
-stats_df = pd.DataFrame([{
-    "指標": ["累積報酬率", "年化報酬率", "年化波動率", "最大回落（MDD）"],
-    "數值": [acc_return, annual_return, volatility, mdd]
-}]).explode(["指標", "數值"])
-
-# ✅ 包含 日期、美元計價、匯率、台幣計價、成交量
-merged_zh = df_merged.reset_index().copy()
-merged_zh["Date"] = pd.to_datetime(merged_zh["date"]).dt.strftime("%Y-%m-%d")
-merged_zh["Price_TWD"] = merged_zh["close"].round(1)
-
-# 匯率欄位
-if "usd_to_twd" not in merged_zh.columns:
-    merged_zh["usd_to_twd"] = 0.0  # 若無匯率，補上預設值（或改為 np.nan）
-
-merged_zh["ExchangeRate"] = merged_zh["usd_to_twd"].round(4)
-
-merged_zh["Price_USD"] = (merged_zh["Price_TWD"] / merged_zh["ExchangeRate"]).round(1)
-
-# 成交量欄位
-if "volume" in merged_zh.columns:
-    merged_zh["Volume"] = merged_zh["volume"].round(0).astype(int)
-else:
-    merged_zh["Volume"] = 0  # 或 np.nan
-
-# 選出需要的 5 個欄位
-merged_zh = merged_zh[["Date", "Price_USD", "ExchangeRate", "Price_TWD", "Volume"]]
+# 取得價格資料，依日期對齊匯率換算台幣 / 美元價格並計算報酬統計（與背景匯出共用同一套計算）
+stats, stats_df, merged_zh = export_jobs.build_report_inputs(
+    get_price_data(selected.id, start_date, end_date), native_currency, fx_converter
+)
+acc_return = stats["cumulative_return"]
+annual_return = stats["annualized_return"]
+volatility = stats["annualized_volatility"]
+mdd = stats["max_drawdown"]
 
 
 # 點擊確認後執行儲存邏輯
-PREF_DB_PATH = 'user_preferences.db'
-
 if save_pref_btn:
     # 四個統計指標取小數點後 1 位
     user_pref = {
@@ -432,8 +403,7 @@ if save_pref_btn:
     # SQLite 儲存（可保留原寫法）
     elif save_pref_format == "SQLite":
         db_path = save_user_preference(user_pref)
-        time.sleep(2)
-        with open('data/user_preferences.db', 'rb') as f:
+        with open(db_path, 'rb') as f:
             db_data = f.read()
         st.sidebar.download_button(
             label="⬇️ 下載偏好設定 (SQLite)",
@@ -447,64 +417,42 @@ if save_pref_btn:
 #            匯出 Excel / PDF
 # -----------------------------------
 
+# 報告在背景執行緒池產生，頁面只送出工作並輪詢結果；相同的匯出只會產生一次
 if export_btn:
-    if export_format == "PDF":
-        if daily_returns is None or len(daily_returns) == 0:
-            st.sidebar.error("⚠️ 無法匯出 PDF：daily_returns 沒有資料。")
-        else:
-            with st.spinner("📄 產生 PDF 中..."): 
-                # print(f"type(fig) = {type(fig)}")
-                # print(merged_zh.head(5).to_dict(orient="records"))
-                pdf_data = generate_pdf_report(
-                    acc_return, annual_return, volatility, mdd,
-                    merged_zh
-                )
-
-            st.sidebar.success("✅ PDF 產生成功")
-            st.sidebar.download_button(
-                label="⬇️ 下載 PDF",
-                data=pdf_data,
-                file_name=f"{selected.symbol}_report.pdf",
-                mime="application/pdf"
-            )
-    elif export_format == "Excel":
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # 寫入報酬統計表
-            stats_df.to_excel(writer, sheet_name='報酬統計', index=False)
-            workbook = writer.book
-            worksheet = writer.sheets['報酬統計']
-            
-            # 設定格式
-            bold = workbook.add_format({'bold': True})
-            percent_fmt = workbook.add_format({'num_format': '0.00%'})
-            worksheet.set_column('A:A', 20, bold)
-            worksheet.set_column('B:B', 18, percent_fmt)
-    
-            # 檢查是否有台幣價格與匯率欄位
-            if "ExchangeRate" in merged_zh.columns and "Price_TWD" in merged_zh.columns:
-                merged_zh = merged_zh[["Date", "Price_USD", "ExchangeRate", "Price_TWD", "Volume"]]
-            else:
-                merged_zh = merged_zh[["Date", "Price_USD", "Volume"]]
-
-    
-            # 寫入每日價格資料
-            merged_zh.to_excel(writer, sheet_name='每日價格資料', index=False)
-            worksheet2 = writer.sheets['每日價格資料']
-            worksheet2.set_column(0, len(merged_zh.columns)-1, 15)
-    
-            for idx, col in enumerate(merged_zh.columns):
-                worksheet2.set_column(idx, idx, 20)
-        output.seek(0)
-    
-        st.sidebar.success("✅ 準備下載 Excel，請點下方按鈕")
-        st.sidebar.download_button(
-            label="⬇️ 匯出 Excel",
-            data=output,
-            file_name=f"{selected.symbol}_data.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    if merged_zh.empty:
+        st.sidebar.error("⚠️ 無法匯出：區間內沒有價格資料。")
+    else:
+        st.session_state.export_job = export_jobs.submit(selected.id, start_date, end_date, export_format)
+
+export_job = st.session_state.get("export_job")
+export_state = export_jobs.status(export_job)[0] if export_job else None
+
+
+@st.fragment(run_every=1.0 if export_state == "running" else None)
+def show_export_status():
+    state, payload = export_jobs.status(export_job)
+    if state == "running":
+        st.info("⏳ 報告產生中，完成後會出現下載按鈕")
+    elif export_state == "running":
+        st.rerun()  # 工作完成：整頁重跑一次，停止輪詢並顯示下載按鈕
+    elif state == "error":
+        st.error(f"❌ 匯出失敗：{payload}")
+    elif state == "done":
+        symbol_id, _, _, fmt, _ = export_job
+        symbol = symbols_df.loc[symbols_df["id"] == symbol_id, "symbol"].iloc[0]
+        st.success(f"✅ {fmt} 產生完成")
+        st.download_button(
+            label=f"⬇️ 下載 {fmt}",
+            data=payload,
+            file_name=export_jobs.file_name(symbol, fmt),
+            mime=export_jobs.FORMATS[fmt][1],
         )
 
+
+if export_job:
+    with st.sidebar:
+        show_export_status()
+
 # -----------------------------------
 #            多標的收比較
 # -----------------------------------
@@ -520,69 +468,54 @@ if st.session_state.compare_mode:
         format_func=lambda x: f"{x.name} ({x.symbol})"
     )
 
-    indicator_options = [
-        "close", "rsi14", "MA5", "MA20", "MA60", "macd", 
-        "累積報酬率", "年化報酬率", "年化波動率", "最大回落（MDD）"
-    ]
+    rolling_indicators = {
+        "滾動波動率": "rolling_volatility",
+        "滾動夏普比率": "rolling_sharpe",
+        "滾動最大回落": "rolling_max_drawdown",
+        "滾動相關係數（對第一個標的）": "rolling_correlation",
+    }
+    line_indicators = ["close", "rsi14", "MA5", "MA20", "MA60", "macd"] + list(rolling_indicators)
+    stat_indicators = {label: metric for metric, label in risk.METRIC_LABELS.items()}
+    indicator_options = line_indicators + list(stat_indicators)
     selected_indicator = st.selectbox("選擇要比較的指標", indicator_options, index=0)
 
     if compare_selection:
-        result_dict = {}
-        for item in compare_selection:
-            df = get_price_data(item.id, start_date, end_date).copy()
-            df["date"] = pd.to_datetime(df["date"])
-            df.set_index("date", inplace=True)
-            df = df.dropna(subset=["close"])
-
-            # 計算技術指標 (會自動加上 ma5, ma20, ma60, rsi14, macd...)
-            df_ind = indicators.compute_indicators(df)
-
-            if selected_indicator == "close":
-                series = df_ind["close"]
-                result_dict[item.symbol] = series
-
-            elif selected_indicator == "rsi14":
-                series = df_ind.get("rsi14")
-                result_dict[item.symbol] = series
-
-            elif selected_indicator.lower() in ["ma5", "ma20", "ma60"]:
-                ma_col = selected_indicator.upper()  # "MA5", "MA20", ...
-                series = df_ind.get(ma_col)
-                if series is not None:
-                    result_dict[item.symbol] = series
-
-            elif selected_indicator == "macd":
-                series = df_ind.get("macd")
-                result_dict[item.symbol] = series
-
-            elif selected_indicator == "累積報酬率":
-                daily_returns = df_ind["close"].pct_change().dropna()
-                cum_ret = indicators.cumulative_return(daily_returns)
-                result_dict[item.symbol] = cum_ret
-
-            elif selected_indicator == "年化報酬率":
-                daily_returns = df_ind["close"].pct_change().dropna()
-                ann_ret = indicators.annualized_return(daily_returns)
-                result_dict[item.symbol] = ann_ret
-
-            elif selected_indicator == "年化波動率":
-                daily_returns = df_ind["close"].pct_change().dropna()
-                ann_vol = indicators.annualized_volatility(daily_returns)
-                result_dict[item.symbol] = ann_vol
-
-            elif selected_indicator == "最大回落（MDD）":
-                daily_returns = df_ind["close"].pct_change().dropna()
-                mdd = indicators.max_drawdown(daily_returns)
-                result_dict[item.symbol] = mdd
-
-        if selected_indicator in ["close", "rsi14", "MA5", "MA20", "MA60", "macd"]:
+        symbol_ids = [item.id for item in compare_selection]
+        labels = {item.id: item.symbol for item in compare_selection}
+
+        if selected_indicator in rolling_indicators:
+            # 往前多讀一個視窗長度（交易日換算為日曆天）讓區間起點就有滾動值
+            lookback = int(rolling_window * 1.5) + 10
+            panel = get_close_panel(symbol_ids, start_date - timedelta(days=lookback), end_date)
+            returns = risk.returns_from_prices(panel)
+            if rolling_indicators[selected_indicator] == "rolling_correlation":
+                combined = indicators.rolling_correlation(returns, returns[symbol_ids[0]], rolling_window)
+            else:
+                combined = risk.rolling_summary(returns, window=rolling_window)[rolling_indicators[selected_indicator]]
+            combined = combined[combined.index >= pd.Timestamp(start_date)]
+            result_dict = {labels[symbol_id]: combined[symbol_id] for symbol_id in combined.columns}
+        elif selected_indicator in line_indicators:
+            # 一次查詢讀取所有標的的收盤價寬表（往前多讀一段作為指標暖身），只計算選定的指標
+            lookback = 0 if selected_indicator == "close" else INDICATOR_LOOKBACK_DAYS
+            panel = get_close_panel(symbol_ids, start_date - timedelta(days=lookback), end_date)
+            combined = indicators.compute_panel_indicator(panel, selected_indicator)
+            combined = combined[combined.index >= pd.Timestamp(start_date)]
+            result_dict = {labels[symbol_id]: combined[symbol_id] for symbol_id in combined.columns}
+        else:
+            # 所有標的的報酬率矩陣一次算出統計
+            panel = get_close_panel(symbol_ids, start_date, end_date)
+            stats = risk.summarize(risk.returns_from_prices(panel))
+            result_dict = {labels[symbol_id]: stats.at[symbol_id, stat_indicators[selected_indicator]]
+                           for symbol_id in stats.index}
+
+        if selected_indicator in line_indicators:
             combined_df = pd.concat(result_dict.values(), axis=1)
             combined_df.columns = result_dict.keys()
             combined_df.dropna(how='all', inplace=True)
 
             fig = go.Figure()
             for col in combined_df.columns:
-                fig.add_trace(go.Scatter(x=combined_df.index, y=combined_df[col], mode="lines", name=col))
+                fig.add_trace(line_trace(combined_df.index, combined_df[col], name=col, width_px=chart_width))
 
             fig.update_layout(
                 title=f"📊 多標的 {selected_indicator} 比較",
@@ -609,7 +542,7 @@ if st.session_state.compare_mode:
                     x=[symbol],
                     y=[value],
                     name=symbol,
-                    text=f"{value:.2%}" if '報酬率' in selected_indicator else f"{value:.2f}",
+                    text=f"{value:.2f}" if '比率' in selected_indicator else f"{value:.2%}",
                     textposition="auto"
                 ))
         
@@ -621,6 +554,36 @@ if st.session_state.compare_mode:
             )
             st.plotly_chart(fig, use_container_width=True)
 
+    if len(compare_selection) >= 2:
+        st.subheader("🔗 報酬率相關係數 / 共變異數矩陣")
+        matrix_type = st.radio("矩陣類型", ["相關係數", "共變異數（年化）"], horizontal=True)
+        cov_matrix, corr_matrix = get_pairwise_moments([item.id for item in compare_selection], start_date, end_date)
+        matrix = corr_matrix if matrix_type == "相關係數" else cov_matrix * risk.PERIODS_PER_YEAR
+        order = [item.id for item in compare_selection]
+        names = [item.symbol for item in compare_selection]
+        matrix = matrix.loc[order, order]
+
+        fig_matrix = go.Figure(go.Heatmap(
+            z=matrix.to_numpy(),
+            x=names,
+            y=names,
+            colorscale="RdBu",
+            reversescale=True,
+            zmid=0,
+            text=matrix.round(3).to_numpy(),
+            texttemplate="%{text}",
+        ))
+        fig_matrix.update_layout(title=f"📊 {matrix_type}（{start_date} ~ {end_date}）", yaxis_autorange="reversed")
+        st.plotly_chart(fig_matrix, use_container_width=True)
+
+    with st.expander("🏆 全部標的風險排行"):
+        rank_label = st.selectbox("排序依據", list(stat_indicators), index=3)
+        all_panel = get_close_panel(symbols_df["id"].tolist(), start_date, end_date)
+        ranking = risk.summarize(risk.returns_from_prices(all_panel))
+        ranking.index = symbols_df.set_index("id").loc[ranking.index, "symbol"]
+        ranking = ranking.sort_values(stat_indicators[rank_label], ascending=False)
+        st.dataframe(ranking.rename(columns=risk.METRIC_LABELS), use_container_width=True)
+
     if st.button("🔙 關閉多標的分析"):
         st.session_state.compare_mode = False
         st.rerun()
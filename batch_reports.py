@@ -0,0 +1,118 @@
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from modules import schema
+from modules.db_utils import get_connection, get_symbols
+from modules.export_jobs import FORMATS, build_report_inputs, file_name, native_currency, render_report
+from modules.fx import FxConverter
+
+# 批次產生多個標的的 PDF / Excel 報告：
+# 一次查詢載入所有標的的價格，在主程序組好報告內容後交給多個程序並行產生檔案，
+# 每完成一份就寫入輸出資料夾（不把所有報告留在記憶體）。
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+
+
+# ----------------------
+# 資料載入
+# ----------------------
+def load_prices(symbol_ids, start_date=None, end_date=None):
+    """以單一查詢讀取多個標的的日價格，回傳 {symbol_id: DataFrame(date, close, volume)}"""
+    query = f"""
+        SELECT symbol_id, date, close, volume FROM price_data
+        WHERE symbol_id IN ({", ".join("?" * len(symbol_ids))})
+    """
+    params = [int(symbol_id) for symbol_id in symbol_ids]
+    if start_date is not None:
+        query += " AND date >= ?"
+        params.append(schema.encode_date(start_date))
+    if end_date is not None:
+        query += " AND date <= ?"
+        params.append(schema.encode_date(end_date))
+    df = pd.read_sql_query(query + " ORDER BY symbol_id, date", get_connection(), params=params)
+    df["date"] = schema.decode_dates(df["date"])
+    return {symbol_id: group.drop(columns="symbol_id").reset_index(drop=True)
+            for symbol_id, group in df.groupby("symbol_id", sort=False)}
+
+
+def select_symbols(symbols=None):
+    """指定的 symbol 字串列表；未指定時為全部標的"""
+    df = get_symbols()
+    if symbols:
+        missing = sorted(set(symbols) - set(df["symbol"]))
+        if missing:
+            print(f"⚠️ 資料庫中沒有這些標的：{', '.join(missing)}")
+        df = df[df["symbol"].isin(symbols)]
+    return df
+
+
+# ----------------------
+# 產生報告
+# ----------------------
+def _render(fmt, inputs):
+    return render_report(fmt, *inputs)
+
+
+def generate_reports(symbols=None, start_date=None, end_date=None, formats=("PDF",),
+                     output_dir=OUTPUT_DIR, workers=None):
+    """
+    產生報告並寫入 output_dir，回傳寫入的檔案路徑列表。
+    同時送進程序池的工作數量有上限（workers 的兩倍），報告內容不會一次全部堆在記憶體。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    targets = select_symbols(symbols)
+    prices = load_prices(targets["id"].tolist(), start_date, end_date)
+    converter = FxConverter.from_db()
+
+    def jobs():
+        for row in targets.itertuples(index=False):
+            frame = prices.get(row.id)
+            if frame is None or frame["close"].notna().sum() == 0:
+                print(f"⚠️ {row.symbol} 在區間內沒有價格資料，略過")
+                continue
+            inputs = build_report_inputs(frame, native_currency(row.currency, row.region), converter)
+            for fmt in formats:
+                yield os.path.join(output_dir, file_name(row.symbol, fmt)), fmt, inputs
+
+    workers = workers or os.cpu_count() or 1
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        queue = jobs()
+        while True:
+            for path, fmt, inputs in queue:
+                pending[pool.submit(_render, fmt, inputs)] = path
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    content = future.result()
+                except Exception as e:
+                    print(f"❌ {os.path.basename(path)} 產生失敗：{e}")
+                    continue
+                with open(path, "wb") as f:
+                    f.write(content)
+                written.append(path)
+                print(f"✅ {os.path.basename(path)}（{len(content) / 1024:.0f} KB）")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批次產生多個標的的 PDF / Excel 報告")
+    parser.add_argument("symbols", nargs="*", help="標的代號（未指定時為全部標的）")
+    parser.add_argument("--start", help="起始日期 YYYY-MM-DD（預設為最早資料）")
+    parser.add_argument("--end", help="結束日期 YYYY-MM-DD（預設為最新資料）")
+    parser.add_argument("--format", choices=[*FORMATS, "all"], default="PDF", help="報告格式")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="輸出資料夾")
+    parser.add_argument("--workers", type=int, default=None, help="並行程序數（預設為 CPU 核心數）")
+    args = parser.parse_args()
+
+    formats = list(FORMATS) if args.format == "all" else [args.format]
+    paths = generate_reports(args.symbols, args.start, args.end, formats, args.output, args.workers)
+    print(f"📦 共產生 {len(paths)} 份報告：{args.output}")
@@ -3,54 +3,24 @@ import sqlite3
 import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
+from modules.db_pool import DB_PATH
+from modules.schema import ensure_schema, decode_date, decode_dates, encode_dates
+from modules.db_utils import bump_data_version, update_price_bars
+from modules.fx import refresh_converted_prices
+from modules.column_store import refresh_mirror
+from modules.backup import export_delta
+from modules.indicator_store import rebuild_indicators
 
 # ----------------------
 # 資料庫初始化
 # ----------------------
 def init_db():
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect("data/finance_data.db")
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    # 建立資料表
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS symbols (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT UNIQUE,
-            name TEXT,
-            type TEXT,
-            region TEXT,
-            currency TEXT
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol_id INTEGER,
-            date DATE,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume REAL,
-            UNIQUE(symbol_id, date)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS converted_price_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            price_data_id INTEGER,
-            converted_price REAL,
-            converted_currency TEXT,
-            FOREIGN KEY (price_data_id) REFERENCES price_data(id)
-        )
-    ''')
-
-    # 建立索引以提升查詢效能
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_symbol ON symbols(symbol)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_symbol_id ON price_data(symbol_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON price_data(date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_symbol_date ON price_data(symbol_id, date)')
+    # 建立資料表（既有的舊版資料庫會先遷移到最新結構，見 modules/schema.py）
+    ensure_schema(conn)
 
     # 確認 symbols 表格是否存在
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='symbols'")
@@ -82,6 +52,7 @@ def fetch_and_save_data(cursor, conn, targets):
     end_date = datetime.today()
     start_date = end_date - timedelta(days=365)
 
+    loaded = []
     for target in targets:
         print(f"▶ 擷取 {target['symbol']} 資料中...")
         df = yf.download(target["symbol"], start=start_date, end=end_date, auto_adjust=False)
@@ -93,20 +64,7 @@ def fetch_and_save_data(cursor, conn, targets):
             print(f"⚠️ 無法擷取 {target['symbol']} 資料（可能無歷史資料或格式異常），已跳過")
             continue
 
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.droplevel(1)
-
-        df = df.reset_index()
-        df.columns.name = None
-        df.columns = [col.lower() for col in df.columns]
-
-        if "close" in df.columns and not all(col in df.columns for col in ["open", "high", "low"]):
-            df["open"] = df["high"] = df["low"] = df["close"]
-        if "volume" not in df.columns:
-            df["volume"] = 0
-
-        df = df.dropna()
-        df = df[(df[["open", "high", "low", "close"]] > 0).all(axis=1)]
+        df = clean_price_frame(df)
 
         print(f"清理後資料筆數：{len(df)}")
         print(df.head())
@@ -122,79 +80,59 @@ def fetch_and_save_data(cursor, conn, targets):
         }
         symbol_id = insert_symbol_get_id(cursor, conn, symbol_data)
 
-        # 寫入 price_data
-        for _, row in df.iterrows():
-            cursor.execute('''
-                INSERT OR IGNORE INTO price_data
-                (symbol_id, date, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                symbol_id,
-                row['date'].date(),
-                row['open'],
-                row['high'],
-                row['low'],
-                row['close'],
-                row['volume']
-            ))
-        
-            cursor.execute('SELECT id FROM price_data WHERE symbol_id = ? AND date = ?', (symbol_id, row['date'].date()))
-            price_data_id = cursor.fetchone()[0]
-        
-            # 判斷原始幣別
-            if target['region'] == 'US' or target['symbol'].endswith('.US'):
-                original_currency = 'USD'
-            elif target['region'] == 'TW' or target['symbol'].endswith('.TW'):
-                original_currency = 'TWD'
-            else:
-                original_currency = None
-        
-            # 匯率轉換：從 price_data 查詢 USDTWD=X 的最新收盤價
-            converted_price = None
-            converted_currency = None
-        
-            if original_currency in ['USD', 'TWD']:
-                # 找出 USDTWD=X 的 symbol_id
-                cursor.execute("SELECT id FROM symbols WHERE symbol = 'USDTWD=X'")
-                usd_twd_symbol_id_row = cursor.fetchone()
-        
-                if usd_twd_symbol_id_row:
-                    usd_twd_symbol_id = usd_twd_symbol_id_row[0]
-
-                    # 查詢最新一筆 USDTWD=X 的收盤價
-                    cursor.execute('''
-                        SELECT close FROM price_data
-                        WHERE symbol_id = ?
-                        ORDER BY date DESC
-                        LIMIT 1
-                    ''', (usd_twd_symbol_id,))
-                    rate_row = cursor.fetchone()
-        
-                    if rate_row:
-                        exchange_rate = rate_row[0]
-        
-                        if original_currency == 'USD':
-                            converted_price = row['close'] * exchange_rate
-                            converted_currency = 'TWD'
-                        elif original_currency == 'TWD':
-                            converted_price = row['close'] / exchange_rate
-                            converted_currency = 'USD'
-        
-            # 寫入 converted_price_data
-            if converted_price and converted_currency:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO converted_price_data
-                    (price_data_id, converted_price, converted_currency)
-                    VALUES (?, ?, ?)
-                ''', (price_data_id, converted_price, converted_currency))
+        # 寫入 price_data：整個標的一次 executemany，一個標的 commit 一次
+        rows = list(zip(
+            [symbol_id] * len(df),
+            encode_dates(df["date"]),
+            *(df[col].astype("float64").tolist() for col in ["open", "high", "low", "close", "volume"])
+        ))
+        cursor.executemany('''
+            INSERT OR IGNORE INTO price_data
+            (symbol_id, date, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        bump_data_version(conn, symbol_id)
+        rebuild_indicators(conn, symbol_id)
+        update_price_bars(conn, symbol_id)
         conn.commit()
+        loaded.append(symbol_id)
+
+    # 所有標的寫入後，再依日期對齊的匯率一次重建換算結果
+    count = refresh_converted_prices(conn, loaded)
+    conn.commit()
+    print(f"💱 已寫入 {count} 筆匯率換算資料")
+
+    # 建立 / 更新 price_data 的欄式鏡像
+    changed = refresh_mirror(conn, loaded)
+    print(f"🗂️ 欄式鏡像已更新 {changed} 個標的")
+
+# ----------------------
+# 價格資料清理
+# ----------------------
+def clean_price_frame(df):
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.droplevel(1)
+
+    df = df.reset_index()
+    df.columns.name = None
+    df.columns = [col.lower() for col in df.columns]
+
+    if "close" in df.columns and not all(col in df.columns for col in ["open", "high", "low"]):
+        df["open"] = df["high"] = df["low"] = df["close"]
+    if "volume" not in df.columns:
+        df["volume"] = 0
+
+    df = df.dropna()
+    df = df[(df[["open", "high", "low", "close"]] > 0).all(axis=1)]
+    df["date"] = pd.to_datetime(df["date"])
+    return df
 
 # ----------------------
 # 驗證資料
 # ----------------------
 def validate_data(cursor):
     cursor.execute('''
-        SELECT s.name, s.symbol, COUNT(p.id), MIN(p.date), MAX(p.date)
+        SELECT s.name, s.symbol, COUNT(*), MIN(p.date), MAX(p.date)
         FROM symbols s
         JOIN price_data p ON s.id = p.symbol_id
         GROUP BY s.symbol
@@ -202,7 +140,7 @@ def validate_data(cursor):
     ''')
     print("✅ 隨機抽查結果：")
     for row in cursor.fetchall():
-        print(f"✔ {row[0]} ({row[1]}): {row[2]} 筆，期間 {row[3]} ~ {row[4]}")
+        print(f"✔ {row[0]} ({row[1]}): {row[2]} 筆，期間 {decode_date(row[3])} ~ {decode_date(row[4])}")
 
 # ----------------------
 # 顯示前幾筆資料
@@ -227,35 +165,34 @@ def preview_data(conn, cursor):
         ORDER BY p.date DESC
         LIMIT 10
     """, conn)
+    df_prices["date"] = decode_dates(df_prices["date"])
     print(df_prices)
 
     print("\n💱 每個 symbol 的最新轉換資料：")
     df_converted = pd.read_sql_query("""
-        SELECT s.symbol, p.date, c.converted_price, c.converted_currency
+        SELECT s.symbol, c.date, c.converted_price, c.converted_currency
         FROM converted_price_data c
-        JOIN price_data p ON c.price_data_id = p.id
-        JOIN symbols s ON p.symbol_id = s.id
-        WHERE (s.symbol, p.date) IN (
-            SELECT s2.symbol, MAX(p2.date)
-            FROM converted_price_data c2
-            JOIN price_data p2 ON c2.price_data_id = p2.id
-            JOIN symbols s2 ON p2.symbol_id = s2.id
-            GROUP BY s2.symbol
+        JOIN symbols s ON c.symbol_id = s.id
+        WHERE (c.symbol_id, c.date) IN (
+            SELECT symbol_id, MAX(date)
+            FROM converted_price_data
+            GROUP BY symbol_id
         )
-        ORDER BY p.date DESC
+        ORDER BY c.date DESC
     """, conn)
+    df_converted["date"] = decode_dates(df_converted["date"])
     print(df_converted)
 
     
 # ----------------------
-# 資料庫匯出為 SQL 檔案
+# 備份：只匯出上次備份之後的新資料（gzip 串流，見 modules/backup.py）
 # ----------------------
-def export_db_to_sql():
-    conn = sqlite3.connect('data/finance_data.db')
-    with open('data/finance_data.sql', 'w') as f:
-        for line in conn.iterdump():
-            f.write('%s\n' % line)
-    print("資料庫已匯出為 data/finance_data.sql")
+def export_backup():
+    path, count = export_delta()
+    if path:
+        print(f"資料庫新資料 {count} 筆已匯出為 {path}")
+    else:
+        print("沒有新資料需要備份")
 
 # ----------------------
 # 生成 csv
@@ -289,6 +226,6 @@ if __name__ == "__main__":
     fetch_and_save_data(cursor, conn, targets)
     validate_data(cursor)
     preview_data(conn, cursor)
-    export_db_to_sql()
+    export_backup()
     export_symbols_to_csv(conn)
     conn.close()
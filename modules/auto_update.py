@@ -1,152 +1,204 @@
+import os
+import sys
 import schedule
 import time
 import pandas as pd
-import sqlite3
 import yfinance as yf
-from datetime import datetime, timedelta
-
-DB_PATH = 'data/finance_data.db'  # 請根據實際路徑調整
-
-def get_all_symbols(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT symbol FROM symbols")
-    return [row[0] for row in cursor.fetchall()]
-
-def get_symbol_id(conn, symbol):
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM symbols WHERE symbol = ?", (symbol,))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    else:
-        raise ValueError(f"❌ 無法找到 symbol：{symbol} 對應的 symbol_id")
-
-def get_latest_date(conn, symbol):
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(date) FROM price_data WHERE symbol_id = ?", (symbol,))
-    result = cursor.fetchone()
-    if result and result[0]:
-        return datetime.strptime(result[0], '%Y-%m-%d')
-    return None
-
-def update_symbol_data(conn, symbol):
-    try:
-        symbol_id = get_symbol_id(conn, symbol)
-        latest_date = get_latest_date(conn, symbol_id)
-        today = datetime.now().date()
-
-        # 決定下載的日期範圍
-        start_date = (latest_date + timedelta(days=1)).date() if latest_date else datetime(2000, 1, 1).date()
-        end_date = today
-
-        if start_date > end_date:
-            print(f"⚠️ {symbol} 沒有新資料需要更新 (latest={latest_date.date() if latest_date else '無'}, today={end_date})")
-            return
-
-        # 執行資料下載
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from modules import column_store, schema
+from modules.db_pool import DB_PATH, write_connection
+from modules.db_utils import bump_data_version, update_price_bars
+from modules.fx import refresh_converted_prices
+from modules.indicator_store import update_indicators
+from modules.trading_calendar import last_closed_session
+
+# 下載階段設定：同時下載的標的數、失敗重試次數與退避秒數（可用環境變數覆寫）
+FETCH_WORKERS = int(os.environ.get("FINANCE_FETCH_WORKERS", 8))
+FETCH_RETRIES = int(os.environ.get("FINANCE_FETCH_RETRIES", 3))
+FETCH_BACKOFF = float(os.environ.get("FINANCE_FETCH_BACKOFF", 2.0))
+
+# 增量同步的單一工作：標的、symbol_id 與需要下載的日期區間
+SyncTask = namedtuple("SyncTask", ["symbol", "symbol_id", "start_date", "end_date"])
+
+BACKFILL_START = date(2000, 1, 1)
+
+WATERMARK_SQL = """
+    SELECT s.id, s.symbol, s.region, s.type, MAX(p.date)
+    FROM symbols s
+    LEFT JOIN price_data p ON p.symbol_id = s.id
+    GROUP BY s.id, s.symbol, s.region, s.type
+    ORDER BY s.id
+"""
+
+def plan_updates(conn, symbols=None, now=None):
+    """
+    以一次 GROUP BY 查詢取得所有標的的 symbol_id 與最新日期（watermark），
+    再依各市場交易日曆略過尚未有新收盤交易日的標的（週末、假日不會發出下載）。
+    回傳 SyncTask 列表。
+    """
+    rows = conn.execute(WATERMARK_SQL).fetchall()
+    wanted = set(symbols) if symbols is not None else None
+
+    tasks = []
+    for symbol_id, symbol, region, symbol_type, watermark in rows:
+        if wanted is not None and symbol not in wanted:
+            continue
+        last_session = last_closed_session(region, symbol_type, now)
+        latest = schema.decode_date(watermark)
+        if latest is not None and last_session <= latest:
+            print(f"⚠️ {symbol} 沒有新資料需要更新 (latest={latest}, 最近收盤日={last_session})")
+            continue
+        start_date = latest + timedelta(days=1) if latest else BACKFILL_START
+        tasks.append(SyncTask(symbol, symbol_id, start_date, last_session))
+
+    if wanted is not None:
+        missing = wanted - {symbol for _, symbol, _, _, _ in rows}
+        for symbol in sorted(missing):
+            print(f"❌ 無法找到 symbol：{symbol} 對應的 symbol_id")
+    return tasks
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+UPSERT_PRICE_SQL = '''
+    INSERT OR REPLACE INTO price_data
+    (symbol_id, date, open, high, low, close, volume)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _flatten_columns(data, symbol):
+    """yfinance 可能回傳 (Price, Ticker) 兩層欄位，統一轉成單層 Open/High/... 欄位"""
+    if isinstance(data.columns, pd.MultiIndex):
+        tickers = data.columns.get_level_values(-1)
+        if symbol in tickers:
+            data = data.xs(symbol, axis=1, level=-1)
+        else:
+            data = data.droplevel(-1, axis=1)
+    return data
+
+def frame_to_rows(data, symbol_id, symbol):
+    """
+    將 yfinance 下載結果一次轉為欄位陣列，再組成 executemany 需要的 tuple 列表。
+    支援單層與 MultiIndex 欄位格式。
+    """
+    data = _flatten_columns(data, symbol)
+    if "Date" in data.columns:
+        data = data.set_index("Date")
+    dates = schema.encode_dates(data.index)
+    columns = [data[col].to_numpy(dtype="float64").tolist() for col in PRICE_COLUMNS]
+    return list(zip([symbol_id] * len(dates), dates, *columns))
+
+def bulk_upsert_prices(conn, symbol_id, rows):
+    """以單一交易 executemany 寫入多筆價格資料，更新資料版本與受影響的週 / 月 K"""
+    if not rows:
+        return 0
+    with conn:
+        conn.executemany(UPSERT_PRICE_SQL, rows)
+        bump_data_version(conn, symbol_id)
+        update_price_bars(conn, symbol_id, since=min(row[1] for row in rows))
+    return len(rows)
+
+def yfinance_fetcher(symbol, start_date, end_date):
+    """預設下載器：向 yfinance 下載 [start_date, end_date] 的日線資料"""
+    return yf.download(symbol, start=start_date, end=end_date + timedelta(days=1), progress=False, auto_adjust=False)
+
+def fetch_with_retry(fetcher, symbol, start_date, end_date, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
+    """呼叫下載器，失敗時以指數退避重試"""
+    for attempt in range(retries + 1):
         try:
-            data = yf.download(symbol, start=start_date, end=end_date + timedelta(days=1), progress=False, auto_adjust=False)
-        except Exception as e:
-            print(f"❌ 無法下載 {symbol} 的資料：{e}")
-            return
-
-        if data.empty:
-            print(f"⚠️ {symbol} 沒有新資料")
-            return
-
-        data.reset_index(inplace=True)
-        cursor = conn.cursor()
-
-        count = 0
-        for _, row in data.iterrows():
-            date = pd.to_datetime(row['Date']).strftime('%Y-%m-%d')
-
-            cursor.execute('''
-                INSERT OR REPLACE INTO price_data 
-                (symbol_id, date, open, high, low, close, volume) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                symbol_id,
-                date,
-                row['Open'],
-                row['High'],
-                row['Low'],
-                row['Close'],
-                row['Volume']
-            ))
-            count += 1
-
-        conn.commit()
-        print(f"✅ {symbol} 更新完成，共新增/更新 {count} 筆資料")
-
-    except Exception as e:
-        print(f"❌ 更新 {symbol} 發生錯誤：{e}")
-
-
-def update_symbol_data(conn, symbol):
+            return fetcher(symbol, start_date, end_date)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+def fetch_all(jobs, fetcher=yfinance_fetcher, max_workers=FETCH_WORKERS, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
+    """
+    以有上限的執行緒池同時下載多個標的。
+    jobs 為 SyncTask（symbol, symbol_id, start_date, end_date）列表，
+    依完成順序產生 (symbol, symbol_id, data, error)，由呼叫端在單一執行緒寫入資料庫。
+    fetcher 可替換（例如測試時使用本地假資料）。
+    """
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+        futures = {
+            executor.submit(fetch_with_retry, fetcher, symbol, start_date, end_date, retries, backoff): (symbol, symbol_id)
+            for symbol, symbol_id, start_date, end_date in jobs
+        }
+        for future in as_completed(futures):
+            symbol, symbol_id = futures[future]
+            try:
+                yield symbol, symbol_id, future.result(), None
+            except Exception as e:
+                yield symbol, symbol_id, None, e
+
+def save_fetched_data(conn, symbol, symbol_id, data):
+    """將下載結果寫入資料庫，回傳寫入筆數"""
+    if data is None or data.empty:
+        print(f"⚠️ {symbol} 沒有新資料")
+        return 0
+    rows = frame_to_rows(data, symbol_id, symbol)
+    count = bulk_upsert_prices(conn, symbol_id, rows)
+    # 技術指標只延伸新資料的部分
+    with conn:
+        update_indicators(conn, symbol_id)
+    print(f"✅ {symbol} 更新完成，共新增/更新 {count} 筆資料")
+    return count
+
+def refresh_conversions(conn, updated_ids):
+    """重建新資料影響到的匯率換算；匯率標的本身有更新時，所有標的都要重算"""
+    if not updated_ids:
+        return 0
+    fx_ids = {row[0] for row in conn.execute("SELECT id FROM symbols WHERE type = 'currency'").fetchall()}
+    with conn:
+        return refresh_converted_prices(conn, None if updated_ids & fx_ids else updated_ids)
+
+def update_symbol_data(conn, symbol, fetcher=yfinance_fetcher):
     try:
-        symbol_id = get_symbol_id(conn, symbol)
-        latest_date = get_latest_date(conn, symbol_id)
-        today = datetime.now().date()
-
-        start_date = (latest_date + timedelta(days=1)).date() if latest_date else datetime(2000, 1, 1).date()
-        end_date = today
-
-        if start_date > end_date:
-            print(f"⚠️ {symbol} 沒有新資料需要更新 (latest={latest_date.date() if latest_date else '無'}, today={end_date})")
+        tasks = plan_updates(conn, symbols=[symbol])
+        if not tasks:
             return
+        task = tasks[0]
 
         try:
-            data = yf.download(symbol, start=start_date, end=end_date + timedelta(days=1), progress=False, auto_adjust=False)
+            data = fetch_with_retry(fetcher, task.symbol, task.start_date, task.end_date)
         except Exception as e:
             print(f"❌ 無法下載 {symbol} 的資料：{e}")
             return
 
-        if data.empty:
-            print(f"⚠️ {symbol} 沒有新資料")
-            return
-
-        data.reset_index(inplace=True)
-        # print(data.columns)
-
-        cursor = conn.cursor()
-        count = 0
-
-        for _, row in data.iterrows():
-            date_val = row[('Date', '')]
-            # 確保 date_val 是 Timestamp
-            if not isinstance(date_val, pd.Timestamp):
-                date_val = pd.to_datetime(date_val)
-            date_str = date_val.strftime('%Y-%m-%d')
-
-            open_ = row[('Open', symbol)]
-            high_ = row[('High', symbol)]
-            low_ = row[('Low', symbol)]
-            close_ = row[('Close', symbol)]
-            volume_ = row[('Volume', symbol)]
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO price_data 
-                (symbol_id, date, open, high, low, close, volume) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (symbol_id, date_str, open_, high_, low_, close_, volume_))
-            count += 1
-
-        conn.commit()
-        print(f"✅ {symbol} 更新完成，共新增/更新 {count} 筆資料")
+        if save_fetched_data(conn, symbol, task.symbol_id, data):
+            refresh_conversions(conn, {task.symbol_id})
 
     except Exception as e:
         print(f"❌ 更新 {symbol} 發生錯誤：{e}")
 
-def main():
+def main(fetcher=yfinance_fetcher, max_workers=FETCH_WORKERS, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
     print("開始更新所有標的資料")
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        symbols = get_all_symbols(conn)
-        for symbol in symbols:
-            update_symbol_data(conn, symbol)
-    finally:
-        conn.close()
+    with write_connection(DB_PATH) as conn:
+        jobs = plan_updates(conn)
+        print(f"共 {len(jobs)} 個標的需要更新")
+
+        # 下載並行進行，寫入仍由這個執行緒依序完成（SQLite 只有一個寫入者）
+        updated = set()
+        for symbol, symbol_id, data, error in fetch_all(jobs, fetcher, max_workers, retries, backoff):
+            if error is not None:
+                print(f"❌ 無法下載 {symbol} 的資料：{error}")
+                continue
+            try:
+                if save_fetched_data(conn, symbol, symbol_id, data):
+                    updated.add(symbol_id)
+            except Exception as e:
+                print(f"❌ 更新 {symbol} 發生錯誤：{e}")
+
+        count = refresh_conversions(conn, updated)
+        print(f"💱 已重建 {count} 筆匯率換算資料")
+
+        # 同步欄式鏡像（只處理資料版本有變動的標的）
+        changed = column_store.refresh_mirror(conn)
+        print(f"🗂️ 欄式鏡像已更新 {changed} 個標的")
     print("所有標的資料更新完成")
     
 def job():
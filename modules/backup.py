@@ -0,0 +1,234 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from modules import schema
+from modules.db_pool import DB_PATH, close_all, get_read_connection, write_connection
+from modules.db_utils import bump_data_version, get_data_versions, update_price_bars
+
+# 備份檔存放位置；增量匯出的 watermark（各標的已匯出的最後日期）記在 manifest.json
+BACKUP_DIR = os.path.join(os.path.dirname(DB_PATH), "backups")
+MANIFEST_NAME = "manifest.json"
+
+# 每批寫入 / 讀取的筆數，匯出與還原都以串流處理，不把整個資料表載入記憶體
+BATCH_SIZE = 5000
+
+PRICE_FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+def _new_path(backup_dir, prefix, extension):
+    """以時間戳（含微秒）命名備份檔，檔名排序即為建立順序，還原時可直接依檔名套用"""
+    return os.path.join(backup_dir, f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{extension}")
+
+
+def _load_manifest(backup_dir):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest, backup_dir):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+# ----------------------
+# 完整快照：SQLite online backup API + gzip
+# ----------------------
+def snapshot(db_path=DB_PATH, backup_dir=BACKUP_DIR):
+    """
+    以 SQLite backup API 取得一致的線上快照（不需停止讀寫），再以 gzip 串流壓縮。
+    回傳快照檔路徑。
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    target = _new_path(backup_dir, "snapshot", ".db.gz")
+    with tempfile.TemporaryDirectory() as workdir:
+        copy_path = os.path.join(workdir, "snapshot.db")
+        source = sqlite3.connect(db_path)
+        dest = sqlite3.connect(copy_path)
+        try:
+            source.backup(dest, pages=1024)
+        finally:
+            dest.close()
+            source.close()
+        with open(copy_path, "rb") as src, gzip.open(target, "wb", compresslevel=6) as out:
+            shutil.copyfileobj(src, out, length=1024 * 1024)
+    return target
+
+
+def restore_snapshot(snapshot_path, db_path=DB_PATH):
+    """
+    以快照覆蓋資料庫（先解壓到暫存檔，完成後再替換，避免留下半個檔案）。
+    還原後所有標的的資料版本都推進到比還原前更新，讓讀取端快取失效；欄式鏡像內容可能與快照不同，整個重建。
+    """
+    from modules import column_store
+
+    previous = get_data_versions(db_path) if os.path.exists(db_path) else {}
+    tmp = db_path + ".restore"
+    with gzip.open(snapshot_path, "rb") as src, open(tmp, "wb") as out:
+        shutil.copyfileobj(src, out, length=1024 * 1024)
+    close_all()  # 既有連線仍指向被替換掉的檔案
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.replace(tmp, db_path)
+
+    with write_connection(db_path) as conn:
+        for (symbol_id,) in conn.execute("SELECT id FROM symbols").fetchall():
+            bump_data_version(conn, symbol_id)
+            # 快照中的版本可能比現行資料庫舊，+1 後仍可能撞上快取中的版本
+            conn.execute("UPDATE data_versions SET version = MAX(version, ?) WHERE symbol_id = ?",
+                         (previous.get(symbol_id, 0) + 1, symbol_id))
+        if os.path.abspath(db_path) == DB_PATH:
+            shutil.rmtree(column_store.MIRROR_DIR, ignore_errors=True)
+            column_store.refresh_mirror(conn)
+    return db_path
+
+
+# ----------------------
+# 增量匯出：每個標的只匯出 watermark 之後的新資料
+# ----------------------
+def export_delta(db_path=DB_PATH, backup_dir=BACKUP_DIR, full=False):
+    """
+    將 watermark 之後新增的價格資料串流寫成 gzip CSV（以 symbol 字串識別標的，可還原到其他資料庫）。
+    檔案內容：symbol 列（標的基本資料，全部）與 price 列（各標的新資料）。
+    full=True 時忽略 watermark 匯出全部資料。沒有新資料時不產生檔案，回傳 (路徑或 None, 匯出筆數)。
+    注意：watermark 之前的歷史資料若被修正，需用 snapshot() 或 full=True 重新備份。
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    manifest = {} if full else _load_manifest(backup_dir)
+    conn = get_read_connection(db_path)
+
+    symbols = conn.execute("SELECT id, symbol, name, type, region, currency FROM symbols ORDER BY id").fetchall()
+    pending = []
+    for symbol_id, symbol, *_ in symbols:
+        watermark = manifest.get(symbol)
+        latest = conn.execute("SELECT MAX(date) FROM price_data WHERE symbol_id = ?", (symbol_id,)).fetchone()[0]
+        if latest is not None and (watermark is None or latest > watermark):
+            pending.append((symbol_id, symbol, watermark, latest))
+    if not pending:
+        return None, 0
+
+    target = _new_path(backup_dir, "full" if full else "delta", ".csv.gz")
+    count = 0
+    with gzip.open(target, "wt", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        for _, symbol, name, symbol_type, region, currency in symbols:
+            writer.writerow(["symbol", symbol, name, symbol_type, region, currency])
+        for symbol_id, symbol, watermark, latest in pending:
+            cursor = conn.execute(
+                f"SELECT date, {', '.join(PRICE_FIELDS)} FROM price_data "
+                "WHERE symbol_id = ? AND date > ? AND date <= ? ORDER BY date",
+                (symbol_id, -1 if watermark is None else watermark, latest),
+            )
+            while True:
+                rows = cursor.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                writer.writerows(
+                    ["price", symbol, schema.decode_date(day).isoformat(), *values] for day, *values in rows
+                )
+                count += len(rows)
+            manifest[symbol] = latest
+
+    _save_manifest(manifest, backup_dir)
+    return target, count
+
+
+# ----------------------
+# 還原：批次寫入匯出檔
+# ----------------------
+def _number(text, cast=float):
+    return None if text == "" else cast(float(text))
+
+
+def restore_delta(paths, db_path=DB_PATH):
+    """
+    依序讀入一或多個匯出檔（完整 + 增量），以 executemany 批次寫入。
+    寫入後更新資料版本並重建受影響標的的技術指標、週 / 月 K、匯率換算與欄式鏡像。回傳寫入筆數。
+    """
+    from modules import column_store
+    from modules.fx import refresh_converted_prices
+    from modules.indicator_store import rebuild_indicators
+
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    total = 0
+    touched = set()
+    with write_connection(db_path) as conn:
+        symbol_ids = dict(conn.execute("SELECT symbol, id FROM symbols").fetchall())
+        for path in paths:
+            with gzip.open(path, "rt", encoding="utf-8", newline="") as src:
+                batch = []
+                for record in csv.reader(src):
+                    if record[0] == "symbol":
+                        symbol, name, symbol_type, region, currency = record[1:]
+                        if symbol not in symbol_ids:
+                            cursor = conn.execute(
+                                "INSERT INTO symbols (symbol, name, type, region, currency) VALUES (?, ?, ?, ?, ?)",
+                                (symbol, name, symbol_type, region, currency or None),
+                            )
+                            symbol_ids[symbol] = cursor.lastrowid
+                        continue
+                    symbol, day, *values = record[1:]
+                    symbol_id = symbol_ids[symbol]
+                    touched.add(symbol_id)
+                    batch.append((
+                        symbol_id, schema.encode_date(day),
+                        *(_number(v) for v in values[:-1]), _number(values[-1], int),
+                    ))
+                    if len(batch) >= BATCH_SIZE:
+                        total += _write_prices(conn, batch)
+                        batch = []
+                total += _write_prices(conn, batch)
+
+        for symbol_id in sorted(touched):
+            bump_data_version(conn, symbol_id)
+            rebuild_indicators(conn, symbol_id)
+            update_price_bars(conn, symbol_id)
+        refresh_converted_prices(conn, touched)
+        if os.path.abspath(db_path) == DB_PATH:
+            column_store.refresh_mirror(conn, touched)
+    return total
+
+
+def _write_prices(conn, rows):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO price_data (symbol_id, date, {', '.join(PRICE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="資料庫備份 / 還原")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("snapshot", help="完整快照（SQLite backup API + gzip）")
+    delta = sub.add_parser("delta", help="匯出 watermark 之後的新資料")
+    delta.add_argument("--full", action="store_true", help="忽略 watermark 匯出全部資料")
+    restore = sub.add_parser("restore", help="還原快照（.db.gz）或匯出檔（.csv.gz，可多個依序套用）")
+    restore.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        print(f"✅ 已建立快照：{snapshot()}")
+    elif args.command == "delta":
+        path, count = export_delta(full=args.full)
+        print(f"✅ 已匯出 {count} 筆：{path}" if path else "⚠️ 沒有新資料需要匯出")
+    elif args.files[0].endswith(".db.gz"):
+        print(f"✅ 已還原快照至：{restore_snapshot(args.files[0])}")
+    else:
+        print(f"✅ 已還原 {restore_delta(args.files)} 筆價格資料")
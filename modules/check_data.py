@@ -1,29 +1,10 @@
-import sqlite3
+import os
+import sys
 import pandas as pd
-
-def get_connection():
-    return sqlite3.connect("data/finance_data.db")
-
-def get_symbols():
-    conn = get_connection()
-    df = pd.read_sql("SELECT id, symbol, name, type, region FROM symbols ORDER BY region, type", conn)
-    conn.close()
-    return df
-
-def get_price_data(symbol_id, start_date=None, end_date=None):
-    conn = get_connection()
-    query = """
-        SELECT date, open, high, low, close, volume
-        FROM price_data
-        WHERE symbol_id = ?
-    """
-    params = [symbol_id]
-    if start_date and end_date:
-        query += " AND date BETWEEN ? AND ?"
-        params += [start_date, end_date]
-    df = pd.read_sql_query(query, conn, params=params, parse_dates=["date"])
-    conn.close()
-    return df.sort_values("date")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from modules.db_utils import get_connection, get_symbols, get_price_data
+from modules.indicators import verify_against_pandas_ta
+from modules import column_store, schema
 
 def main():
     # 1. 取得所有 symbols
@@ -52,10 +33,23 @@ def main():
     conn = get_connection()
     query = "SELECT MIN(date) AS min_date, MAX(date) AS max_date FROM price_data WHERE symbol_id = ?"
     df_range = pd.read_sql_query(query, conn, params=[2])
-    conn.close()
+    df_range = df_range.apply(lambda col: col.map(schema.decode_date))
     print("USDTWD=X 資料日期範圍：")
     print(df_range)
 
+    # 指標核心與 pandas_ta 的對照（最大絕對誤差，應在 1e-8 以內）
+    print("指標核心與 pandas_ta 對照：")
+    for name, diff in verify_against_pandas_ta(price_df_all["close"].dropna()).items():
+        status = "✅" if diff < 1e-8 else "❌"
+        print(f"{status} {name}: {diff:.2e}")
+
+    # 欄式鏡像與 SQL 讀取的對照與耗時
+    result = column_store.benchmark(conn, symbol_id)
+    if result["same"]:
+        print(f"✅ 欄式鏡像內容一致：SQL {result['sql'] * 1000:.2f} ms / 鏡像 {result['mirror'] * 1000:.2f} ms")
+    else:
+        print("⚠️ 欄式鏡像不存在或與資料庫不一致，請執行 auto_update 更新")
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules import schema
+from modules.db_pool import DB_PATH
+
+# price_data 的欄式鏡像：每個標的兩個原始二進位檔
+#   {symbol_id}.dates  int32，自 1970-01-01 起的日數（與 price_data.date 相同編碼，遞增）
+#   {symbol_id}.ohlcv  float64，每列 open, high, low, close, volume
+# 有效列數與對應的資料版本記在 manifest.json，讀取時以 np.memmap 映射、searchsorted 切出日期區間，
+# 不經過 sqlite 的逐列物件與日期字串解析。鏡像不存在或版本落後時，db_utils 會改回 SQL 查詢。
+MIRROR_DIR = os.path.join(os.path.dirname(DB_PATH), "columnar")
+MANIFEST_NAME = "manifest.json"
+FIELDS = ["open", "high", "low", "close", "volume"]
+
+# 設為 0 可停用鏡像讀取（一律走 SQL）
+USE_MIRROR = os.environ.get("FINANCE_COLUMNAR", "1") != "0"
+
+
+def _paths(symbol_id, mirror_dir):
+    base = os.path.join(mirror_dir, str(int(symbol_id)))
+    return base + ".dates", base + ".ohlcv"
+
+
+# ----------------------
+# manifest
+# ----------------------
+_manifest_cache = {}
+
+
+def load_manifest(mirror_dir=MIRROR_DIR):
+    """讀取 manifest（依檔案修改時間快取）；尚未建立時回傳空 dict"""
+    path = os.path.join(mirror_dir, MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            cached = (mtime, json.load(f))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+
+def _save_manifest(manifest, mirror_dir):
+    path = os.path.join(mirror_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)  # 原子替換，讀取端不會看到寫一半的 manifest
+
+
+# ----------------------
+# 寫入（增量同步）
+# ----------------------
+def _write_at(path, offset, data):
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        f.seek(offset)
+        f.write(data.tobytes())
+
+
+def _sync_symbol(conn, symbol_id, entry, mirror_dir):
+    """
+    從鏡像最後一筆（含）開始重新寫入：最後一筆可能被覆寫，之後的資料直接附加。
+    若最後一筆之前的列數與資料庫不符（歷史被補齊或修改），整檔重建。
+    """
+    rows = entry["rows"] if entry else 0
+    if rows:
+        before = conn.execute(
+            "SELECT COUNT(*) FROM price_data WHERE symbol_id = ? AND date < ?",
+            (symbol_id, entry["last_day"]),
+        ).fetchone()[0]
+        if before != rows - 1:
+            rows = 0
+    keep = rows - 1 if rows else 0
+
+    query = "SELECT date, open, high, low, close, volume FROM price_data WHERE symbol_id = ?"
+    params = [symbol_id]
+    if keep:
+        query += " AND date >= ?"
+        params.append(entry["last_day"])
+    fetched = conn.execute(query + " ORDER BY date", params).fetchall()
+    if not fetched:
+        return {"rows": keep, "last_day": entry["last_day"] if keep else None}
+
+    dates = np.array([row[0] for row in fetched], dtype="int32")
+    values = np.array([row[1:] for row in fetched], dtype="float64")
+
+    dates_path, values_path = _paths(symbol_id, mirror_dir)
+    _write_at(dates_path, keep * 4, dates)
+    _write_at(values_path, keep * 8 * len(FIELDS), values)
+    return {"rows": keep + len(fetched), "last_day": int(dates[-1])}
+
+
+def refresh_mirror(conn, symbol_ids=None, mirror_dir=MIRROR_DIR):
+    """讓鏡像跟上 price_data；只處理資料版本有變動的標的，回傳更新的標的數"""
+    os.makedirs(mirror_dir, exist_ok=True)
+    try:
+        versions = dict(conn.execute("SELECT symbol_id, version FROM data_versions").fetchall())
+    except sqlite3.OperationalError:
+        versions = {}
+    if symbol_ids is None:
+        symbol_ids = [row[0] for row in conn.execute("SELECT id FROM symbols").fetchall()]
+
+    manifest = dict(load_manifest(mirror_dir))
+    changed = 0
+    for symbol_id in symbol_ids:
+        symbol_id = int(symbol_id)
+        entry = manifest.get(str(symbol_id))
+        version = versions.get(symbol_id, 0)
+        if entry is not None and entry["version"] == version:
+            continue
+        entry = _sync_symbol(conn, symbol_id, entry, mirror_dir)
+        entry["version"] = version
+        manifest[str(symbol_id)] = entry
+        changed += 1
+    if changed:
+        _save_manifest(manifest, mirror_dir)
+    return changed
+
+
+# ----------------------
+# 讀取
+# ----------------------
+def _open(symbol_id, rows, mirror_dir):
+    if rows == 0:
+        return np.empty(0, dtype="int32"), np.empty((0, len(FIELDS)))
+    dates_path, values_path = _paths(symbol_id, mirror_dir)
+    dates = np.memmap(dates_path, dtype="int32", mode="r", shape=(rows,))
+    values = np.memmap(values_path, dtype="float64", mode="r", shape=(rows, len(FIELDS)))
+    return dates, values
+
+
+def _slice(dates, start_date, end_date):
+    lo = 0 if start_date is None else int(np.searchsorted(dates, schema.encode_date(start_date), side="left"))
+    hi = len(dates) if end_date is None else int(np.searchsorted(dates, schema.encode_date(end_date), side="right"))
+    return lo, hi
+
+
+def mirror_entry(symbol_id, version, mirror_dir=MIRROR_DIR):
+    """鏡像中與指定資料版本一致的 manifest 項目；未啟用、不存在或過期時回傳 None"""
+    if not USE_MIRROR:
+        return None
+    entry = load_manifest(mirror_dir).get(str(int(symbol_id)))
+    if entry is None or entry["version"] != version:
+        return None
+    return entry
+
+
+def read_prices(symbol_id, start_date=None, end_date=None, version=0, mirror_dir=MIRROR_DIR):
+    """從鏡像讀取單一標的的 OHLCV（欄位同 db_utils.get_price_data）；無法使用鏡像時回傳 None"""
+    entry = mirror_entry(symbol_id, version, mirror_dir)
+    if entry is None:
+        return None
+    dates, values = _open(symbol_id, entry["rows"], mirror_dir)
+    lo, hi = _slice(dates, start_date, end_date)
+    df = pd.DataFrame(np.asarray(values[lo:hi]), columns=FIELDS)
+    if not df["volume"].isna().any():
+        # 鏡像一律存 float64；volume 在 SQL 中是 INTEGER，沒有 NULL 時 read_sql 會給 int64
+        df["volume"] = df["volume"].astype("int64")
+    df.insert(0, "date", schema.decode_dates(dates[lo:hi]))
+    return df
+
+
+def read_close_panel(symbol_ids, start_date=None, end_date=None, versions=None, mirror_dir=MIRROR_DIR):
+    """從鏡像組出收盤價寬表（同 db_utils.get_close_panel）；任一標的無法使用鏡像時回傳 None"""
+    versions = versions or {}
+    columns = []
+    for symbol_id in symbol_ids:
+        entry = mirror_entry(symbol_id, versions.get(symbol_id, 0), mirror_dir)
+        if entry is None:
+            return None
+        dates, values = _open(symbol_id, entry["rows"], mirror_dir)
+        lo, hi = _slice(dates, start_date, end_date)
+        columns.append((dates[lo:hi], values[lo:hi, FIELDS.index("close")]))
+
+    # 各標的日期取聯集後，以 searchsorted 把每欄放到對應列
+    all_days = np.unique(np.concatenate([d for d, _ in columns])) if columns else np.empty(0, dtype="int32")
+    panel = np.full((len(all_days), len(columns)), np.nan)
+    for j, (days, close) in enumerate(columns):
+        panel[np.searchsorted(all_days, days), j] = close
+    index = pd.DatetimeIndex(schema.decode_dates(all_days), name="date")
+    return pd.DataFrame(panel, index=index, columns=pd.Index(list(symbol_ids), name="symbol_id"))
+
+
+def benchmark(conn, symbol_id, repeat=20, mirror_dir=MIRROR_DIR):
+    """比較 SQL 與鏡像讀取整段資料的平均耗時（秒），並確認內容一致"""
+    try:
+        version = (dict(conn.execute("SELECT symbol_id, version FROM data_versions").fetchall())
+                   .get(int(symbol_id), 0))
+    except sqlite3.OperationalError:
+        version = 0
+    query = "SELECT date, open, high, low, close, volume FROM price_data WHERE symbol_id = ? ORDER BY date"
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        from_sql = pd.read_sql_query(query, conn, params=[int(symbol_id)])
+        from_sql["date"] = schema.decode_dates(from_sql["date"])
+    sql_seconds = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        from_mirror = read_prices(symbol_id, version=version, mirror_dir=mirror_dir)
+    mirror_seconds = (time.perf_counter() - start) / repeat
+
+    same = from_mirror is not None and np.allclose(
+        from_sql[FIELDS].to_numpy(dtype="float64"), from_mirror[FIELDS].to_numpy(), equal_nan=True
+    ) and (from_sql["date"].to_numpy() == from_mirror["date"].to_numpy()).all()
+    return {"sql": sql_seconds, "mirror": mirror_seconds, "same": bool(same)}
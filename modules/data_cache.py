@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+
+from modules import db_utils, indicator_store, risk
+from modules.fx import FxConverter
+
+# 快取最多保留的查詢結果數量，超過時淘汰最久未使用者
+MAX_ENTRIES = 64
+
+
+class LRUCache:
+    """執行緒安全、有容量上限的 LRU 快取；每筆資料記錄其所屬標的與資料版本"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            symbol_id, entry_version, value = entry
+            if entry_version != version:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, symbol_id, version, value):
+        with self._lock:
+            self._data[key] = (symbol_id, version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate_symbol(self, symbol_id):
+        """移除某標的相關的快取，連同跨標的資料（symbol_id 為 None，例如 symbols 表）"""
+        with self._lock:
+            for key in [k for k, (sid, _, _) in self._data.items()
+                        if sid == symbol_id or sid is None or (isinstance(sid, tuple) and symbol_id in sid)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_cache = LRUCache()
+_versions = None
+_versions_lock = threading.Lock()
+
+
+def refresh_versions():
+    """
+    每次 Streamlit rerun 開頭呼叫一次：讀取最新資料版本，
+    有新資料寫入的標的會立即從快取移除。
+    """
+    global _versions
+    latest = db_utils.get_data_versions()
+    with _versions_lock:
+        previous = _versions
+        _versions = latest
+    if previous is not None:
+        for symbol_id in set(previous) | set(latest):
+            if previous.get(symbol_id) != latest.get(symbol_id):
+                _cache.invalidate_symbol(symbol_id)
+    return latest
+
+
+def _version_of(symbol_id):
+    if _versions is None:
+        refresh_versions()
+    if symbol_id is None:
+        # 跨標的資料：任何標的更新都視為新版本
+        return sum(_versions.values())
+    if isinstance(symbol_id, tuple):
+        # 多標的資料：任一標的更新即為新版本
+        return tuple(_versions.get(sid, 0) for sid in symbol_id)
+    return _versions.get(int(symbol_id), 0)
+
+
+def _cached(key, symbol_id, loader, copy=True):
+    version = _version_of(symbol_id)
+    value = _cache.get(key, version)
+    if value is None:
+        value = loader()
+        _cache.put(key, symbol_id, version, value)
+    # 呼叫端常會就地修改 DataFrame，回傳複本以免污染快取
+    return value.copy() if copy else value
+
+
+def get_symbols():
+    return _cached(("symbols",), None, db_utils.get_symbols)
+
+
+def get_earliest_date():
+    return _cached(("earliest_date",), None, db_utils.get_earliest_date, copy=False)
+
+
+def get_price_data(symbol_id, start_date=None, end_date=None):
+    symbol_id = int(symbol_id)
+    key = ("price_data", symbol_id, str(start_date), str(end_date))
+    return _cached(key, symbol_id, lambda: db_utils.get_price_data(symbol_id, start_date, end_date))
+
+
+def get_price_bars(symbol_id, start_date=None, end_date=None, level="D"):
+    symbol_id = int(symbol_id)
+    key = ("price_bars", symbol_id, str(start_date), str(end_date), level)
+    return _cached(key, symbol_id, lambda: db_utils.get_price_bars(symbol_id, start_date, end_date, level))
+
+
+def get_indicators(symbol_id, start_date=None, end_date=None):
+    symbol_id = int(symbol_id)
+    key = ("indicators", symbol_id, str(start_date), str(end_date))
+    return _cached(key, symbol_id, lambda: indicator_store.get_indicators(symbol_id, start_date, end_date))
+
+
+def get_close_panel(symbol_ids, start_date=None, end_date=None):
+    symbol_ids = tuple(int(symbol_id) for symbol_id in symbol_ids)
+    key = ("close_panel", symbol_ids, str(start_date), str(end_date))
+    return _cached(key, symbol_ids, lambda: db_utils.get_close_panel(symbol_ids, start_date, end_date))
+
+
+def get_pairwise_moments(symbol_ids, start_date=None, end_date=None):
+    """多標的報酬率的 (共變異數, 相關係數) 矩陣；依標的組合、日期區間與資料版本快取，結果視為唯讀"""
+    symbol_ids = tuple(sorted(int(symbol_id) for symbol_id in symbol_ids))
+    key = ("pairwise_moments", symbol_ids, str(start_date), str(end_date))
+
+    def load():
+        panel = db_utils.get_close_panel(symbol_ids, start_date, end_date)
+        return risk.pairwise_moments(risk.returns_from_prices(panel))
+
+    return _cached(key, symbol_ids, load, copy=False)
+
+
+def get_fx_converter():
+    """匯率換算器（唯讀物件，不複製）；任何標的有新資料時重新載入"""
+    return _cached(("fx",), None, FxConverter.from_db, copy=False)
+
+
+def clear():
+    """清空所有快取"""
+    global _versions
+    _cache.clear()
+    with _versions_lock:
+        _versions = None
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from modules import schema
+
+# 統一的資料庫路徑（以專案根目錄為準，不受執行時工作目錄影響）
+DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'finance_data.db'))
+
+# 每條連線保留的 prepared statement 數量，相同 SQL 字串會直接重用
+CACHED_STATEMENTS = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",       # 讀寫可並行，讀取不會被寫入擋住
+    "PRAGMA synchronous=NORMAL",     # WAL 模式下安全且較快
+    "PRAGMA mmap_size=268435456",    # 256MB 記憶體映射讀取
+    "PRAGMA cache_size=-32000",      # 約 32MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()
+_writer_lock = threading.RLock()
+_writers = {}
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def _ensure_migrated(db_path):
+    """每個資料庫在程序內第一次連線時，自動升級到最新的資料表結構"""
+    if db_path in _migrated:
+        return
+    with _migrate_lock:
+        if db_path in _migrated:
+            return
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("PRAGMA busy_timeout=5000")
+            schema.migrate(conn, verbose=True)
+        finally:
+            conn.close()
+        _migrated.add(db_path)
+
+
+def _connect(db_path, check_same_thread=True):
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    _ensure_migrated(db_path)
+    conn = sqlite3.connect(
+        db_path,
+        check_same_thread=check_same_thread,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_read_connection(db_path=DB_PATH):
+    """
+    取得目前執行緒專用的讀取連線。
+    連線在執行緒內持續保留重用，呼叫端不要 close。
+    """
+    db_path = os.path.abspath(db_path)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = _connect(db_path)
+    return conn
+
+
+@contextmanager
+def write_connection(db_path=DB_PATH):
+    """
+    取得全程序唯一的寫入連線（以鎖序列化所有寫入）。
+    區塊正常結束時 commit，發生例外時 rollback。
+    """
+    db_path = os.path.abspath(db_path)
+    with _writer_lock:
+        conn = _writers.get(db_path)
+        if conn is None:
+            conn = _writers[db_path] = _connect(db_path, check_same_thread=False)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def close_all():
+    """關閉目前執行緒的讀取連線與所有寫入連線（程式結束或測試時使用）"""
+    conns = getattr(_local, "conns", None) or {}
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
+    with _writer_lock:
+        for conn in _writers.values():
+            conn.close()
+        _writers.clear()
@@ -1,37 +1,93 @@
 import os
 import json
 import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from modules.db_pool import DB_PATH, get_read_connection, write_connection
+from modules import column_store, schema
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'finance_data.db')
-DB_PATH = os.path.abspath(DB_PATH)
+# 偏好設定存在 data/ 下（以專案根目錄為準，不受執行時工作目錄影響）
+PREF_DB_PATH = os.path.join(os.path.dirname(DB_PATH), 'user_preferences.db')
 
-PREF_DB_PATH = 'data/user_preferences.db'
-
-def get_connection():
-    return sqlite3.connect("data/finance_data.db")
+def get_connection(db_path=DB_PATH):
+    """共用的讀取連線（由 db_pool 管理，呼叫端不需 close）"""
+    return get_read_connection(db_path)
 
 def get_symbols():
     conn = get_connection()
-    df = pd.read_sql("SELECT id, symbol, name, type, region, currency FROM symbols ORDER BY region, type", conn)
-    conn.close()
-    return df
+    return pd.read_sql("SELECT id, symbol, name, type, region, currency FROM symbols ORDER BY region, type", conn)
 
 def get_price_data(symbol_id, start_date=None, end_date=None):
+    """
+    依日期區間查詢單一標的價格，篩選與排序皆在 SQL 內完成，
+    走 idx_symbol_date 索引，只讀取區間內的資料列。
+    欄式鏡像與資料版本一致時，直接從鏡像切片讀取。
+    """
+    mirrored = column_store.read_prices(symbol_id, start_date, end_date, version=get_data_version(symbol_id))
+    if mirrored is not None:
+        return mirrored
     conn = get_connection()
     query = """
         SELECT date, open, high, low, close, volume
         FROM price_data
         WHERE symbol_id = ?
     """
-    params = [symbol_id] 
-    df = pd.read_sql_query(query, conn, params=params, parse_dates=["date"])
-    conn.close()   
-    return df.sort_values("date")
+    params = [int(symbol_id)]
+    if start_date is not None and end_date is not None:
+        query += " AND date BETWEEN ? AND ?"
+        params += [schema.encode_date(start_date), schema.encode_date(end_date)]
+    elif start_date is not None:
+        query += " AND date >= ?"
+        params.append(schema.encode_date(start_date))
+    elif end_date is not None:
+        query += " AND date <= ?"
+        params.append(schema.encode_date(end_date))
+    query += " ORDER BY date"
+    df = pd.read_sql_query(query, conn, params=params)
+    df["date"] = schema.decode_dates(df["date"])
+    return df
+
+def get_close_panel(symbol_ids, start_date=None, end_date=None):
+    """
+    以一次查詢讀取多個標的的收盤價，回傳寬表（index 為日期、欄位為 symbol_id）。
+    某標的當日無資料（各市場休市日不同）時為 NaN。
+    """
+    symbol_ids = [int(symbol_id) for symbol_id in symbol_ids]
+    if not symbol_ids:
+        return pd.DataFrame()
+    mirrored = column_store.read_close_panel(symbol_ids, start_date, end_date, versions=get_data_versions())
+    if mirrored is not None:
+        return mirrored
+    conn = get_connection()
+    query = f"""
+        SELECT date, symbol_id, close
+        FROM price_data
+        WHERE symbol_id IN ({", ".join("?" * len(symbol_ids))})
+    """
+    params = list(symbol_ids)
+    if start_date is not None:
+        query += " AND date >= ?"
+        params.append(schema.encode_date(start_date))
+    if end_date is not None:
+        query += " AND date <= ?"
+        params.append(schema.encode_date(end_date))
+    query += " ORDER BY date"
+    df = pd.read_sql_query(query, conn, params=params)
+    df["date"] = schema.decode_dates(df["date"])
+    panel = df.pivot(index="date", columns="symbol_id", values="close")
+    return panel.reindex(columns=symbol_ids)
+
+def get_earliest_date():
+    """所有標的中最早一筆價格的日期（datetime.date）；尚無資料時為 None"""
+    conn = get_connection()
+    day = conn.execute("""
+        SELECT MIN((SELECT MIN(date) FROM price_data p WHERE p.symbol_id = s.id)) FROM symbols s
+    """).fetchone()[0]
+    return schema.decode_date(day)
 
 def load_data(symbol, db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection(db_path)
     query = """
     SELECT p.date, p.open, p.high, p.low, p.close, p.volume
     FROM price_data p
@@ -40,12 +96,180 @@ def load_data(symbol, db_path=DB_PATH):
     ORDER BY p.date
     """
     df = pd.read_sql(query, conn, params=(symbol,))
-    conn.close()
-    df['date'] = pd.to_datetime(df['date']).dt.date
+    df['date'] = pd.Series(schema.decode_dates(df['date'])).dt.date
     df = df.sort_values('date')  # 確保時間序列正確
     return df
 
-def save_user_preference(preference: dict, path='user_preference.db'):
+# ----------------------
+# 資料版本（供快取判斷是否失效）
+# ----------------------
+DATA_VERSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        symbol_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )
+"""
+
+def bump_data_version(conn, symbol_id):
+    """寫入新資料後呼叫：將該標的的資料版本 +1，讓讀取端的快取失效"""
+    conn.execute(DATA_VERSIONS_DDL)
+    conn.execute("""
+        INSERT INTO data_versions (symbol_id, version, updated_at)
+        VALUES (?, 1, ?)
+        ON CONFLICT(symbol_id) DO UPDATE SET
+            version = version + 1,
+            updated_at = excluded.updated_at
+    """, (int(symbol_id), datetime.now().isoformat(timespec='seconds')))
+
+def get_data_versions(db_path=DB_PATH):
+    """回傳 {symbol_id: version}；尚未建立版本表時回傳空 dict"""
+    conn = get_connection(db_path)
+    try:
+        rows = conn.execute("SELECT symbol_id, version FROM data_versions").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return dict(rows)
+
+def get_data_version(symbol_id, db_path=DB_PATH):
+    """單一標的的資料版本；尚無紀錄時為 0"""
+    conn = get_connection(db_path)
+    try:
+        row = conn.execute("SELECT version FROM data_versions WHERE symbol_id = ?", (int(symbol_id),)).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+# ----------------------
+# 週 / 月 K 彙總（price_bars）
+# ----------------------
+# level 為 "W"（週一起算）或 "M"（月初起算），period 為該期間第一天的 epoch 日數，
+# last_date 為期間內最後一個交易日。開盤取第一筆、最高 / 最低取極值、收盤取最後一筆、成交量加總。
+BAR_LEVELS = ("W", "M")
+BAR_LABELS = {"D": "日 K", "W": "週 K", "M": "月 K"}
+MIN_CHART_POINTS = 200  # 圖表至少要有的點數，區間夠長時才改用較粗的 K 線
+
+PRICE_BARS_DDL = """
+    CREATE TABLE IF NOT EXISTS price_bars (
+        symbol_id INTEGER NOT NULL,
+        level TEXT NOT NULL,
+        period INTEGER NOT NULL,
+        last_date INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        PRIMARY KEY (symbol_id, level, period)
+    ) WITHOUT ROWID
+"""
+
+def period_start(days, level):
+    """epoch 日數 → 所屬週 / 月第一天的 epoch 日數（1970-01-01 為週四）"""
+    days = np.asarray(days, dtype="int64")
+    if level == "W":
+        return days - (days + 3) % 7
+    months = (np.datetime64("1970-01-01", "D") + days.astype("timedelta64[D]")).astype("datetime64[M]")
+    return (months.astype("datetime64[D]") - np.datetime64("1970-01-01", "D")).astype("int64")
+
+def _aggregate_bars(days, values, level):
+    """依期間分組：values 每列為 open, high, low, close, volume（已依日期排序）"""
+    periods = period_start(days, level)
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+    return list(zip(
+        periods[starts].tolist(),
+        days[ends].tolist(),
+        values[starts, 0].tolist(),
+        np.fmax.reduceat(values[:, 1], starts).tolist(),
+        np.fmin.reduceat(values[:, 2], starts).tolist(),
+        values[ends, 3].tolist(),
+        np.add.reduceat(np.nan_to_num(values[:, 4]), starts).astype("int64").tolist(),
+    ))
+
+def update_price_bars(conn, symbol_id, since=None):
+    """
+    重算 since（epoch 日數）所在的週 / 月起之後的彙總；since 為 None、或該標的該層級尚無任何 K 線時
+    整個標的重建。新增日資料只會影響最後幾個期間，不需重讀整段歷史。回傳寫入的 K 線數。
+    """
+    conn.execute(PRICE_BARS_DDL)
+    symbol_id = int(symbol_id)
+    written = 0
+    for level in BAR_LEVELS:
+        built = conn.execute(
+            "SELECT 1 FROM price_bars WHERE symbol_id = ? AND level = ? LIMIT 1", (symbol_id, level)
+        ).fetchone()
+        start = None if since is None or built is None else int(period_start([since], level)[0])
+        query = "SELECT date, open, high, low, close, volume FROM price_data WHERE symbol_id = ?"
+        delete = "DELETE FROM price_bars WHERE symbol_id = ? AND level = ?"
+        params = [symbol_id]
+        if start is not None:
+            query += " AND date >= ?"
+            delete += " AND period >= ?"
+            params.append(start)
+        rows = conn.execute(query + " ORDER BY date", params).fetchall()
+        conn.execute(delete, [symbol_id, level, *params[1:]])
+        if not rows:
+            continue
+        days = np.array([row[0] for row in rows], dtype="int64")
+        values = np.array([row[1:] for row in rows], dtype="float64")
+        bars = _aggregate_bars(days, values, level)
+        conn.executemany(
+            "INSERT INTO price_bars (symbol_id, level, period, last_date, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(symbol_id, level, *bar) for bar in bars],
+        )
+        written += len(bars)
+    return written
+
+def choose_bar_level(start_date, end_date, min_points=MIN_CHART_POINTS):
+    """
+    依區間長度挑選仍能填滿圖表的最粗層級："M" → "W" → "D"。
+    以日曆天數估計筆數（一週 5 個交易日、一個月約 30.44 天）。
+    """
+    span = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    for level, points in (("M", span / 30.44), ("W", span / 7)):
+        if points >= min_points:
+            return level
+    return "D"
+
+def get_price_bars(symbol_id, start_date=None, end_date=None, level="D"):
+    """
+    讀取日 / 週 / 月 K，欄位同 get_price_data（週 / 月 K 的 date 為期間內最後一個交易日）。
+    彙總表尚未建立或落後於 price_data 時，先補算缺少的期間。
+    """
+    if level == "D":
+        return get_price_data(symbol_id, start_date, end_date)
+    symbol_id = int(symbol_id)
+    conn = get_connection()
+    latest = conn.execute("SELECT MAX(date) FROM price_data WHERE symbol_id = ?", (symbol_id,)).fetchone()[0]
+    try:
+        built = conn.execute(
+            "SELECT MAX(last_date) FROM price_bars WHERE symbol_id = ? AND level = ?", (symbol_id, level)
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        built = None
+    if latest is not None and (built is None or built < latest):
+        with write_connection() as writer:
+            update_price_bars(writer, symbol_id, since=built)
+
+    query = """
+        SELECT last_date AS date, open, high, low, close, volume
+        FROM price_bars
+        WHERE symbol_id = ? AND level = ?
+    """
+    params = [symbol_id, level]
+    if start_date is not None:
+        query += " AND last_date >= ?"
+        params.append(schema.encode_date(start_date))
+    if end_date is not None:
+        query += " AND last_date <= ?"
+        params.append(schema.encode_date(end_date))
+    df = pd.read_sql_query(query + " ORDER BY period", conn, params=params)
+    df["date"] = schema.decode_dates(df["date"])
+    return df
+
+def save_user_preference(preference: dict, path=PREF_DB_PATH):
     conn = sqlite3.connect(path)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS user_pref (
@@ -0,0 +1,33 @@
+import io
+
+import pandas as pd
+
+
+def generate_excel_report(stats_df, merged_zh):
+    """報酬統計與每日價格兩個工作表（與頁面上匯出的版面相同），回傳 BytesIO"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        # 寫入報酬統計表
+        stats_df.to_excel(writer, sheet_name='報酬統計', index=False)
+        workbook = writer.book
+        worksheet = writer.sheets['報酬統計']
+
+        # 設定格式
+        bold = workbook.add_format({'bold': True})
+        percent_fmt = workbook.add_format({'num_format': '0.00%'})
+        worksheet.set_column('A:A', 20, bold)
+        worksheet.set_column('B:B', 18, percent_fmt)
+
+        # 檢查是否有台幣價格與匯率欄位
+        if "ExchangeRate" in merged_zh.columns and "Price_TWD" in merged_zh.columns:
+            merged_zh = merged_zh[["Date", "Price_USD", "ExchangeRate", "Price_TWD", "Volume"]]
+        else:
+            merged_zh = merged_zh[["Date", "Price_USD", "Volume"]]
+
+        # 寫入每日價格資料
+        merged_zh.to_excel(writer, sheet_name='每日價格資料', index=False)
+        worksheet2 = writer.sheets['每日價格資料']
+        for idx, col in enumerate(merged_zh.columns):
+            worksheet2.set_column(idx, idx, 20)
+    output.seek(0)
+    return output
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from modules import db_utils, risk
+from modules.excel_export import generate_excel_report
+from modules.fx import FX_SYMBOLS, FxConverter
+from modules.pdf_export import generate_pdf_report
+
+# 匯出工作在背景執行緒池產生，不佔用 Streamlit 的 rerun；
+# 結果以 (標的, 起日, 迄日, 格式, 資料版本) 為鍵保留（資料版本含換算用的匯率標的），相同的匯出（不論哪個使用者）只產生一次。
+EXPORT_WORKERS = 2
+MAX_RESULTS = 32
+
+FORMATS = {
+    "PDF": ("report.pdf", "application/pdf"),
+    "Excel": ("data.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+STAT_METRICS = ["cumulative_return", "annualized_return", "annualized_volatility", "max_drawdown"]
+
+
+# ----------------------
+# 報告內容（頁面、背景工作與批次報告共用）
+# ----------------------
+def native_currency(currency, region):
+    """標的的原始幣別；symbols.currency 未設定時依市場推定"""
+    return currency or {"US": "USD", "JP": "JPY"}.get(region, "TWD")
+
+
+def build_report_inputs(prices, currency, converter):
+    """
+    日價格（date, close, volume）→ (統計 Series, stats_df, merged_zh)。
+    merged_zh 欄位為 Date / Price_USD / ExchangeRate / Price_TWD / Volume，依日期對齊匯率換算。
+    """
+    df = prices.dropna(subset=["close"]).reset_index(drop=True)
+    dates = pd.to_datetime(df["date"]).dt.normalize()
+    stats = risk.summarize(risk.returns_from_prices(pd.Series(df["close"].to_numpy(), index=dates))).iloc[0]
+    stats_df = pd.DataFrame({
+        "指標": [risk.METRIC_LABELS[metric] for metric in STAT_METRICS],
+        "數值": [stats[metric] for metric in STAT_METRICS],
+    })
+    merged_zh = pd.DataFrame({
+        "Date": dates.dt.strftime("%Y-%m-%d"),
+        "Price_USD": np.round(converter.convert(df["close"], dates, currency, "USD"), 1),
+        "ExchangeRate": np.round(converter.rates("USD", "TWD", dates), 4),
+        "Price_TWD": np.round(converter.convert(df["close"], dates, currency, "TWD"), 1),
+        "Volume": df["volume"].fillna(0).round(0).astype(int) if "volume" in df.columns else 0,
+    })
+    return stats, stats_df, merged_zh
+
+
+def render_report(fmt, stats, stats_df, merged_zh):
+    """產生 PDF 或 Excel 報告的位元組內容"""
+    if fmt == "PDF":
+        output = generate_pdf_report(
+            stats["cumulative_return"], stats["annualized_return"],
+            stats["annualized_volatility"], stats["max_drawdown"], merged_zh,
+        )
+    else:
+        output = generate_excel_report(stats_df, merged_zh)
+    return output.getvalue()
+
+
+def file_name(symbol, fmt):
+    return f"{symbol}_{FORMATS[fmt][0]}"
+
+
+# ----------------------
+# 背景工作佇列
+# ----------------------
+_lock = threading.Lock()
+_jobs = OrderedDict()  # key -> Future（執行中或已完成），依最近使用排序
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+    return _executor
+
+
+def _run_export(symbol_id, start_date, end_date, fmt):
+    """在背景執行緒讀取資料並產生報告（使用該執行緒自己的讀取連線）"""
+    symbols = db_utils.get_symbols().set_index("id")
+    row = symbols.loc[symbol_id]
+    prices = db_utils.get_price_data(symbol_id, start_date, end_date)
+    inputs = build_report_inputs(prices, native_currency(row["currency"], row["region"]), FxConverter.from_db())
+    return render_report(fmt, *inputs)
+
+
+def _evict():
+    """只淘汰已完成的結果，執行中的工作保留"""
+    done = [key for key, future in _jobs.items() if future.done()]
+    for key in done[:max(len(_jobs) - MAX_RESULTS, 0)]:
+        del _jobs[key]
+
+
+def _data_version(symbol_id):
+    """報告用到的資料版本：標的本身與各匯率標的的版本（匯率更新也會改變換算後的價格）"""
+    symbols = db_utils.get_symbols()
+    fx_ids = sorted(symbols.loc[symbols["symbol"].isin(FX_SYMBOLS.values()), "id"].astype(int))
+    versions = db_utils.get_data_versions()
+    return tuple(versions.get(sid, 0) for sid in [symbol_id, *fx_ids])
+
+
+def submit(symbol_id, start_date, end_date, fmt):
+    """
+    送出匯出工作並回傳工作鍵。相同鍵的工作已在執行或已完成時直接沿用（失敗的工作會重新執行）；
+    標的或匯率資料更新後版本不同，會產生新的報告。
+    """
+    symbol_id = int(symbol_id)
+    key = (symbol_id, str(start_date), str(end_date), fmt, _data_version(symbol_id))
+    with _lock:
+        future = _jobs.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            future = _pool().submit(_run_export, symbol_id, start_date, end_date, fmt)
+            _jobs[key] = future
+        _jobs.move_to_end(key)
+        _evict()
+    return key
+
+
+def status(key):
+    """回傳 (狀態, 內容)：("running", None)、("done", bytes)、("error", 例外) 或 ("missing", None)"""
+    with _lock:
+        future = _jobs.get(key)
+    if future is None:
+        return "missing", None
+    if not future.done():
+        return "running", None
+    if future.exception() is not None:
+        return "error", future.exception()
+    return "done", future.result()
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from modules import db_utils, schema
+
+# 資料庫中可用的匯率標的：(基準幣, 報價幣) -> symbol，收盤價代表 1 單位基準幣可換多少報價幣
+FX_SYMBOLS = {
+    ("USD", "TWD"): "USDTWD=X",
+    ("USD", "JPY"): "USDJPY=X",
+    ("TWD", "JPY"): "TWDJPY=X",
+}
+
+# 寫入 converted_price_data 時，各原始幣別要換算成的幣別
+MATERIALIZED_TARGETS = {"USD": "TWD", "TWD": "USD", "JPY": "TWD"}
+
+
+def _to_day_array(dates):
+    """任意日期序列轉為 datetime64[D] 陣列，方便 searchsorted"""
+    return pd.to_datetime(pd.Series(dates)).to_numpy(dtype="datetime64[D]")
+
+
+class FxConverter:
+    """
+    在記憶體中保存每個貨幣對「依日期排序」的匯率序列，
+    以 as-of（取當日或之前最近一筆）方式對齊價格日期，整批向量化換算。
+    """
+
+    def __init__(self, series):
+        # series: {(base, quote): (dates, rates)}
+        self._series = {}
+        for pair, (dates, rates) in series.items():
+            dates = _to_day_array(dates)
+            rates = np.asarray(rates, dtype="float64")
+            valid = ~np.isnan(rates) & (rates > 0)
+            order = np.argsort(dates[valid], kind="stable")
+            self._series[pair] = (dates[valid][order], rates[valid][order])
+
+    @classmethod
+    def from_db(cls, conn=None):
+        """以一次查詢從 price_data 載入所有匯率標的的收盤價"""
+        conn = conn or db_utils.get_connection()
+        pairs = {symbol: pair for pair, symbol in FX_SYMBOLS.items()}
+        placeholders = ", ".join("?" * len(pairs))
+        df = pd.read_sql_query(f"""
+            SELECT s.symbol, p.date, p.close
+            FROM price_data p
+            JOIN symbols s ON s.id = p.symbol_id
+            WHERE s.symbol IN ({placeholders}) AND p.close IS NOT NULL
+            ORDER BY s.symbol, p.date
+        """, conn, params=list(pairs))
+        df["date"] = schema.decode_dates(df["date"])
+        series = {
+            pairs[symbol]: (group["date"], group["close"])
+            for symbol, group in df.groupby("symbol", sort=False)
+        }
+        return cls(series)
+
+    @property
+    def currencies(self):
+        return {currency for pair in self._series for currency in pair}
+
+    def _asof(self, pair, dates):
+        fx_dates, fx_rates = self._series[pair]
+        idx = np.searchsorted(fx_dates, dates, side="right") - 1
+        out = np.full(len(dates), np.nan)
+        found = idx >= 0
+        out[found] = fx_rates[idx[found]]
+        return out
+
+    def rates(self, from_ccy, to_ccy, dates):
+        """回傳每個日期 1 單位 from_ccy 可換得的 to_ccy（當日無報價時沿用前一筆）"""
+        dates = _to_day_array(dates)
+        if from_ccy == to_ccy:
+            return np.ones(len(dates))
+        if (from_ccy, to_ccy) in self._series:
+            return self._asof((from_ccy, to_ccy), dates)
+        if (to_ccy, from_ccy) in self._series:
+            return 1.0 / self._asof((to_ccy, from_ccy), dates)
+        # 沒有直接報價時，經由第三種貨幣交叉換算
+        for via in self.currencies - {from_ccy, to_ccy}:
+            if self._has_pair(from_ccy, via) and self._has_pair(via, to_ccy):
+                return self.rates(from_ccy, via, dates) * self.rates(via, to_ccy, dates)
+        raise ValueError(f"無法換算 {from_ccy} → {to_ccy}：缺少匯率資料")
+
+    def _has_pair(self, a, b):
+        return (a, b) in self._series or (b, a) in self._series
+
+    def convert(self, values, dates, from_ccy, to_ccy):
+        """整批換算價格陣列"""
+        return np.asarray(values, dtype="float64") * self.rates(from_ccy, to_ccy, dates)
+
+
+def refresh_converted_prices(conn, symbol_ids=None, converter=None):
+    """
+    以日期對齊的匯率重建 converted_price_data。
+    symbol_ids 為 None 時處理所有有設定幣別的非匯率標的。不會 commit，交易由呼叫端管理。
+    """
+    converter = converter or FxConverter.from_db(conn)
+    query = "SELECT id, currency FROM symbols WHERE type != 'currency' AND currency IS NOT NULL"
+    targets = [
+        (symbol_id, currency) for symbol_id, currency in conn.execute(query).fetchall()
+        if currency in MATERIALIZED_TARGETS and (symbol_ids is None or symbol_id in symbol_ids)
+    ]
+
+    total = 0
+    for symbol_id, currency in targets:
+        to_ccy = MATERIALIZED_TARGETS[currency]
+        prices = pd.read_sql_query("""
+            SELECT date, close FROM price_data
+            WHERE symbol_id = ? AND close IS NOT NULL
+            ORDER BY date
+        """, conn, params=[symbol_id])
+        days = prices["date"].to_numpy()
+        converted = converter.convert(prices["close"], schema.decode_dates(days), currency, to_ccy)
+        keep = ~np.isnan(converted)
+        count = int(keep.sum())
+        rows = list(zip([symbol_id] * count, days[keep].tolist(), [to_ccy] * count, converted[keep].tolist()))
+
+        conn.execute("DELETE FROM converted_price_data WHERE symbol_id = ?", (symbol_id,))
+        conn.executemany("""
+            INSERT INTO converted_price_data (symbol_id, date, converted_currency, converted_price)
+            VALUES (?, ?, ?, ?)
+        """, rows)
+        total += len(rows)
+    return total
+
@@ -0,0 +1,182 @@
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from modules import db_utils, schema
+from modules.indicators import OnlineMA, OnlineRSI, OnlineMACD
+from modules.db_pool import write_connection
+
+# 預先計算並儲存的指標（與 indicators.compute_indicators 的預設參數一致）
+MA_WINDOWS = (5, 20, 60)
+RSI_LENGTH = 14
+MACD_BASE = 12  # 即 MACD(12, 24, 6)
+
+INDICATOR_COLUMNS = ["ma5", "ma20", "ma60", "rsi14", "macd", "macd_signal", "macd_hist"]
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS price_indicators (
+        symbol_id INTEGER NOT NULL,
+        date INTEGER NOT NULL,
+        ma5 REAL,
+        ma20 REAL,
+        ma60 REAL,
+        rsi14 REAL,
+        macd REAL,
+        macd_signal REAL,
+        macd_hist REAL,
+        PRIMARY KEY (symbol_id, date)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS indicator_state (
+        symbol_id INTEGER PRIMARY KEY,
+        last_date INTEGER NOT NULL,
+        state TEXT NOT NULL
+    )
+    """,
+)
+
+UPSERT_SQL = """
+    INSERT OR REPLACE INTO price_indicators
+    (symbol_id, date, ma5, ma20, ma60, rsi14, macd, macd_signal, macd_hist)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def ensure_tables(conn):
+    for ddl in DDL:
+        conn.execute(ddl)
+
+
+# ----------------------
+# 遞推狀態（使用 indicators 的串流指標物件）
+# ----------------------
+STATE_VERSION = 3
+
+
+def _new_state():
+    state = {f"ma{w}": OnlineMA(w) for w in MA_WINDOWS}
+    state["rsi14"] = OnlineRSI(RSI_LENGTH)
+    state["macd"] = OnlineMACD(MACD_BASE)
+    return state
+
+
+def _dump_state(state):
+    return json.dumps({"version": STATE_VERSION, **{k: v.to_dict() for k, v in state.items()}})
+
+
+def _parse_state(text):
+    """解析已儲存的狀態；格式不符（舊版）時回傳 None，由呼叫端重算"""
+    data = json.loads(text)
+    if data.get("version") != STATE_VERSION:
+        return None
+    state = {f"ma{w}": OnlineMA.from_dict(data[f"ma{w}"]) for w in MA_WINDOWS}
+    state["rsi14"] = OnlineRSI.from_dict(data["rsi14"])
+    state["macd"] = OnlineMACD.from_dict(data["macd"])
+    return state
+
+
+def _step(state, close):
+    """推進一筆收盤價，回傳該日的指標值 tuple（順序同 INDICATOR_COLUMNS）"""
+    mas = [state[f"ma{w}"].update(close) for w in MA_WINDOWS]
+    rsi = state["rsi14"].update(close)
+    macd = state["macd"].update(close)
+    return tuple(None if np.isnan(v) else v for v in (*mas, rsi, *macd))
+
+
+# ----------------------
+# 寫入
+# ----------------------
+def _load_state(conn, symbol_id):
+    row = conn.execute(
+        "SELECT last_date, state FROM indicator_state WHERE symbol_id = ?", (symbol_id,)
+    ).fetchone()
+    if row is None:
+        return None, None
+    return row[0], _parse_state(row[1])
+
+
+def _apply(conn, symbol_id, last_date, state):
+    query = "SELECT date, close FROM price_data WHERE symbol_id = ? AND close IS NOT NULL"
+    params = [symbol_id]
+    if last_date is not None:
+        query += " AND date > ?"
+        params.append(last_date)
+    query += " ORDER BY date"
+    rows = conn.execute(query, params).fetchall()
+    if not rows:
+        return 0
+
+    out = []
+    for date, close in rows:
+        out.append((symbol_id, date, *_step(state, float(close))))
+
+    conn.executemany(UPSERT_SQL, out)
+    conn.execute(
+        "INSERT OR REPLACE INTO indicator_state (symbol_id, last_date, state) VALUES (?, ?, ?)",
+        (symbol_id, rows[-1][0], _dump_state(state)),
+    )
+    return len(out)
+
+
+def update_indicators(conn, symbol_id):
+    """
+    只計算上次處理日之後的新資料列：沿用已儲存的 EMA / RSI 狀態與 MA 回看視窗，
+    不需重算整段歷史。回傳新寫入的筆數。
+    """
+    ensure_tables(conn)
+    last_date, state = _load_state(conn, int(symbol_id))
+    if state is None:
+        return rebuild_indicators(conn, symbol_id)
+    return _apply(conn, int(symbol_id), last_date, state)
+
+
+def rebuild_indicators(conn, symbol_id):
+    """清除既有結果後從頭重算（歷史資料被修正時使用）"""
+    ensure_tables(conn)
+    symbol_id = int(symbol_id)
+    conn.execute("DELETE FROM price_indicators WHERE symbol_id = ?", (symbol_id,))
+    conn.execute("DELETE FROM indicator_state WHERE symbol_id = ?", (symbol_id,))
+    return _apply(conn, symbol_id, None, _new_state())
+
+
+# ----------------------
+# 讀取
+# ----------------------
+def get_indicators(symbol_id, start_date=None, end_date=None):
+    """讀取預先計算的指標；尚未建立或落後於 price_data 時先補算新資料"""
+    symbol_id = int(symbol_id)
+    conn = db_utils.get_connection()
+    try:
+        state_row = conn.execute(
+            "SELECT last_date FROM indicator_state WHERE symbol_id = ?", (symbol_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        state_row = None
+    latest = conn.execute(
+        "SELECT MAX(date) FROM price_data WHERE symbol_id = ?", (symbol_id,)
+    ).fetchone()[0]
+    if latest is not None and (state_row is None or state_row[0] < latest):
+        with write_connection() as writer:
+            update_indicators(writer, symbol_id)
+
+    query = f"""
+        SELECT p.date, p.close, {", ".join("i." + col for col in INDICATOR_COLUMNS)}
+        FROM price_indicators i
+        JOIN price_data p ON p.symbol_id = i.symbol_id AND p.date = i.date
+        WHERE i.symbol_id = ?
+    """
+    params = [symbol_id]
+    if start_date is not None:
+        query += " AND i.date >= ?"
+        params.append(schema.encode_date(start_date))
+    if end_date is not None:
+        query += " AND i.date <= ?"
+        params.append(schema.encode_date(end_date))
+    query += " ORDER BY i.date"
+    df = pd.read_sql_query(query, conn, params=params)
+    df["date"] = schema.decode_dates(df["date"])
+    return df.rename(columns={"ma5": "MA5", "ma20": "MA20", "ma60": "MA60"})
@@ -1,72 +1,525 @@
 import pandas as pd
-import pandas_ta as ta
 import numpy as np
-import sqlite3
+from collections import deque
+
+# -----------------------------------
+#   NumPy 指標核心（整批計算）
+# -----------------------------------
+# 輸入為 float64 陣列：1 維為單一標的，2 維 (日期, 標的) 則對所有欄位同時計算。
+# 遞推方式與 pandas_ta 相同（EMA 以 SMA 起始、RSI 使用 rma），可用 verify_against_pandas_ta 對照。
+
+def _sma(x, window):
+    """以累積和計算移動平均，前 window-1 筆為 NaN"""
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    csum = np.cumsum(x, axis=0)
+    out[window - 1] = csum[window - 1]
+    out[window:] = csum[window:] - csum[:-window]
+    out[window - 1:] /= window
+    return out
+
+def _linear_recurrence(x, out, start, gain, decay):
+    """out[t] = gain * x[t] + decay * out[t-1]，t 從 start 開始（out[start-1] 為起始值）"""
+    if x.ndim == 1:
+        prev = out[start - 1]
+        values = []
+        for value in x[start:].tolist():
+            prev = gain * value + decay * prev
+            values.append(prev)
+        out[start:] = values
+    else:
+        for t in range(start, len(x)):
+            out[t] = gain * x[t] + decay * out[t - 1]
+    return out
+
+def _ema(x, length):
+    """同 pandas_ta.ema：第 length 筆取前 length 筆平均為起始值，之後 adjust=False 遞推"""
+    out = np.full(x.shape, np.nan)
+    if len(x) < length:
+        return out
+    alpha = 2.0 / (length + 1)
+    out[length - 1] = x[:length].mean(axis=0)
+    return _linear_recurrence(x, out, length, alpha, 1.0 - alpha)
+
+def _rma(x, length):
+    """同 pandas_ta.rma = ewm(alpha=1/length, adjust=True, min_periods=length)，x 為第 1 筆起的資料"""
+    decay = 1.0 - 1.0 / length
+    num = np.empty(x.shape)
+    num[0] = x[0]
+    _linear_recurrence(x, num, 1, 1.0, decay)
+    weight = (1.0 - decay ** np.arange(1, len(x) + 1)) / (1.0 - decay)
+    out = num / (weight if x.ndim == 1 else weight[:, None])
+    out[:length - 1] = np.nan
+    return out
+
+def _rsi(close, length=14):
+    out = np.full(close.shape, np.nan)
+    if len(close) <= length:
+        return out
+    diff = np.diff(close, axis=0)
+    gain = _rma(np.where(diff > 0, diff, 0.0), length)
+    loss = np.abs(_rma(np.where(diff < 0, diff, 0.0), length))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[1:] = 100 * gain / (gain + loss)
+    return out
+
+def _macd(close, base_period=12):
+    """回傳 (macd, signal, hist)，fast=base、slow=base*2、signal=max(base//2, 1)"""
+    fast, slow, signal = base_period, base_period * 2, max(base_period // 2, 1)
+    macd = _ema(close, fast) - _ema(close, slow)
+    signal_line = np.full(close.shape, np.nan)
+    if len(close) >= slow:
+        signal_line[slow - 1:] = _ema(macd[slow - 1:], signal)
+    return macd, signal_line, macd - signal_line
+
+def _skip_missing(compute, close, *args):
+    """
+    缺值（NaN）不參與計算：各欄有效值往前集中後計算，再放回原位置（缺值處為 NaN），
+    結果同逐欄 dropna 後計算。否則累積和與遞推會把單一 NaN 一路帶到序列結尾。
+    """
+    close = np.asarray(close, dtype="float64")
+    if not np.isnan(close).any():
+        return compute(close, *args)
+    packed, order, valid = _pack_columns(close.reshape(len(close), -1))
+    result = compute(packed, *args)
+
+    def restore(values):
+        return _unpack_columns(values, order, valid).reshape(close.shape)
+
+    return tuple(restore(r) for r in result) if isinstance(result, tuple) else restore(result)
+
+def compute_indicator_block(close, ma_windows=(5, 20, 60), rsi_length=14, macd_base=12):
+    """
+    一次計算所有指標，回傳 (欄位名稱, 陣列區塊)。
+    區塊形狀為 (日期, 指標) 或 (日期, 指標, 標的)，中間不產生任何 DataFrame 複本。
+    """
+    close = np.asarray(close, dtype="float64")
+    names = [f"MA{w}" for w in ma_windows] + [f"rsi{rsi_length}", "macd", "macd_signal", "macd_hist"]
+    block = np.empty((len(close), len(names)) + close.shape[1:])
+    for i, w in enumerate(ma_windows):
+        block[:, i] = _skip_missing(_sma, close, w)
+    k = len(ma_windows)
+    block[:, k] = _skip_missing(_rsi, close, rsi_length)
+    block[:, k + 1], block[:, k + 2], block[:, k + 3] = _skip_missing(_macd, close, macd_base)
+    return names, block
 
 def calculate_ma(df, window=20):
     """短中長期移動平均"""
     df = df.copy()
-    df[f'MA{window}'] = df['close'].rolling(window=window).mean()
+    df[f'MA{window}'] = _skip_missing(_sma, df['close'].to_numpy(dtype="float64"), window)
     return df
 
 def calculate_rsi(df, length=14):
     """相對強弱指標"""
-    df[f"rsi{length}"] = ta.rsi(df["close"], length=length)
+    df[f"rsi{length}"] = _skip_missing(_rsi, df["close"].to_numpy(dtype="float64"), length)
     return df
     
 def calculate_macd(df, base_period=12):
     """移動平均收斂擴散指標"""
     df = df.copy()
     # 用 base_period 來決定 fast, slow, signal
-    fast = base_period
-    slow = base_period * 2
-    signal = max(base_period // 2, 1)
-
-    macd = ta.macd(df["close"], fast=fast, slow=slow, signal=signal)
-    df["macd"] = macd[f"MACD_{fast}_{slow}_{signal}"]
-    df["macd_signal"] = macd[f"MACDs_{fast}_{slow}_{signal}"]
-    df["macd_hist"] = macd[f"MACDh_{fast}_{slow}_{signal}"]
+    df["macd"], df["macd_signal"], df["macd_hist"] = _skip_missing(_macd, df["close"].to_numpy(dtype="float64"), base_period)
     return df
 
 def compute_indicators(df):
+    names, block = compute_indicator_block(df["close"].to_numpy(dtype="float64"))
     df = df.copy()
-    df = calculate_ma(df, 5)
-    df = calculate_ma(df, 20)
-    df = calculate_ma(df, 60)
-    df = calculate_rsi(df, 14)
-    df = calculate_macd(df)
+    df[names] = block
     return df
 
+def _pack_columns(values):
+    """把每一欄的有效值依原順序往上集中，讓遞推型指標可整批計算；回傳 (packed, order, valid)"""
+    valid = ~np.isnan(values)
+    order = np.argsort(~valid, axis=0, kind="stable")
+    return np.take_along_axis(values, order, axis=0), order, valid
+
+def _unpack_columns(packed, order, valid):
+    out = np.empty(packed.shape)
+    np.put_along_axis(out, order, packed, axis=0)
+    out[~valid] = np.nan
+    return out
+
+def compute_panel_indicator(panel, indicator, macd_base=12):
+    """
+    對 (日期 x 標的) 的收盤價寬表，只計算指定的單一指標，所有標的一次向量化完成。
+    各標的休市日（NaN）不參與計算，結果與逐一標的 dropna 後計算相同。
+    indicator 可為 close、MA{n}、rsi{n}、macd、macd_signal、macd_hist。
+    """
+    if indicator == "close":
+        return panel.copy()
+    packed, order, valid = _pack_columns(panel.to_numpy(dtype="float64"))
+    if indicator in ("macd", "macd_signal", "macd_hist"):
+        result = _macd(packed, macd_base)[("macd", "macd_signal", "macd_hist").index(indicator)]
+    elif indicator.upper().startswith("MA"):
+        result = _sma(packed, int(indicator[2:]))
+    elif indicator.lower().startswith("rsi"):
+        result = _rsi(packed, int(indicator[3:]))
+    else:
+        raise ValueError(f"不支援的指標：{indicator}")
+    return pd.DataFrame(_unpack_columns(result, order, valid), index=panel.index, columns=panel.columns)
+
+def verify_against_pandas_ta(close, ma_windows=(5, 20, 60), rsi_length=14, macd_base=12):
+    """與 pandas_ta 對照，回傳各指標的最大絕對誤差（需安裝 pandas_ta）"""
+    import pandas_ta as ta
+
+    close = pd.Series(np.asarray(close, dtype="float64"))
+    names, block = compute_indicator_block(close.to_numpy(), ma_windows, rsi_length, macd_base)
+    fast, slow, signal = macd_base, macd_base * 2, max(macd_base // 2, 1)
+    macd = ta.macd(close, fast=fast, slow=slow, signal=signal)
+    expected = [close.rolling(w).mean() for w in ma_windows] + [
+        ta.rsi(close, length=rsi_length),
+        macd[f"MACD_{fast}_{slow}_{signal}"],
+        macd[f"MACDs_{fast}_{slow}_{signal}"],
+        macd[f"MACDh_{fast}_{slow}_{signal}"],
+    ]
+    diffs = {}
+    for name, actual, exp in zip(names, block.T, expected):
+        exp = exp.to_numpy(dtype="float64")
+        if not np.array_equal(np.isnan(actual), np.isnan(exp)):
+            diffs[name] = np.inf
+        else:
+            diffs[name] = float(np.nanmax(np.abs(actual - exp), initial=0.0))
+    return diffs
+
+# -----------------------------------
+#   滾動視窗分析
+# -----------------------------------
+# 以下函式接受 Series 或 DataFrame（日期 x 標的），視窗以各欄自身的有效資料筆數計算，
+# 休市日（NaN）略過。變異數 / 共變異數以 Welford 式滑動更新，每筆資料只進出視窗一次；
+# 滾動最大回落把序列切成長度 window 的區塊，以區塊內前綴 / 後綴累計值組出每個視窗，同樣是 O(n)。
+
+def _sliding_comoment(x, y, window):
+    """逐列滑動更新視窗內的平均數與共變異數（樣本，ddof=1）；x、y 為已壓縮的 2-D 陣列"""
+    mean_x = np.full(x.shape, np.nan)
+    mean_y = np.full(x.shape, np.nan)
+    cov = np.full(x.shape, np.nan)
+    mx = np.zeros(x.shape[1])
+    my = np.zeros(x.shape[1])
+    c = np.zeros(x.shape[1])
+    n = 0
+    for i in range(len(x)):
+        # 加入新資料
+        n += 1
+        dx = x[i] - mx
+        mx = mx + dx / n
+        my = my + (y[i] - my) / n
+        c = c + dx * (y[i] - my)
+        # 移出視窗外最舊的一筆
+        if n > window:
+            xo, yo = x[i - window], y[i - window]
+            n -= 1
+            mx_old = ((n + 1) * mx - xo) / n
+            c = c - (xo - mx_old) * (yo - my)
+            my = ((n + 1) * my - yo) / n
+            mx = mx_old
+        if n == window:
+            mean_x[i], mean_y[i], cov[i] = mx, my, c / (window - 1)
+    return mean_x, mean_y, cov
+
+def _window_min_ratio(values, window):
+    """
+    每個長度 window 的視窗內 min(p[j] / p[i])（i <= j），即視窗內的最大回落 + 1。
+    任一視窗最多跨兩個相鄰區塊：前一區塊的後段與後一區塊的前段，
+    答案是兩段各自的最大回落，以及「後段最高價 → 前段最低價」三者中最小的比值。
+    """
+    n = len(values)
+    blocks = -(-n // window)
+    padded = np.pad(values, (0, blocks * window - n), mode="edge").reshape(blocks, window)
+    # 區塊前段（區塊起點 → 各點）
+    prefix_min = np.minimum.accumulate(padded, axis=1).ravel()
+    prefix_ratio = np.minimum.accumulate(padded / np.maximum.accumulate(padded, axis=1), axis=1).ravel()
+    # 區塊後段（各點 → 區塊終點），反轉後同樣以 accumulate 計算
+    rev = padded[:, ::-1]
+    suffix_max = np.maximum.accumulate(rev, axis=1)[:, ::-1].ravel()
+    suffix_ratio = np.minimum.accumulate(np.minimum.accumulate(rev, axis=1) / rev, axis=1)[:, ::-1].ravel()
+
+    start = np.arange(n - window + 1)
+    end = start + window - 1
+    aligned = start % window == 0  # 視窗剛好是一整個區塊
+    cross = np.minimum(suffix_ratio[start], prefix_min[end] / suffix_max[start])
+    return np.where(aligned, prefix_ratio[end], np.minimum(prefix_ratio[end], cross))
+
+def _as_frame(data):
+    return (data.to_frame(), True) if isinstance(data, pd.Series) else (data, False)
+
+def _wrap(values, frame, order, valid, squeeze):
+    out = pd.DataFrame(_unpack_columns(values, order, valid), index=frame.index, columns=frame.columns)
+    return out.iloc[:, 0] if squeeze else out
+
+def rolling_volatility(returns, window=60, periods_per_year=252):
+    """滾動年化波動率"""
+    frame, squeeze = _as_frame(returns)
+    packed, order, valid = _pack_columns(frame.to_numpy(dtype="float64"))
+    _, _, var = _sliding_comoment(packed, packed, window)
+    return _wrap(np.sqrt(np.clip(var, 0, None) * periods_per_year), frame, order, valid, squeeze)
+
+def rolling_sharpe(returns, window=60, risk_free=0.0, periods_per_year=252):
+    """滾動年化夏普比率；risk_free 為年化無風險利率"""
+    frame, squeeze = _as_frame(returns)
+    packed, order, valid = _pack_columns(frame.to_numpy(dtype="float64"))
+    mean, _, var = _sliding_comoment(packed, packed, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (mean - risk_free / periods_per_year) / np.sqrt(var) * np.sqrt(periods_per_year)
+    sharpe[~np.isfinite(sharpe)] = np.nan
+    return _wrap(sharpe, frame, order, valid, squeeze)
+
+def rolling_max_drawdown(prices, window=60):
+    """
+    滾動最大回落：每個 window 期視窗內，各點相對「視窗內先前最高價」的最大跌幅
+    （與對每個視窗單獨計算 MDD 相同），不展開視窗，記憶體與時間皆為 O(n)。
+    """
+    frame, squeeze = _as_frame(prices)
+    packed, order, valid = _pack_columns(frame.to_numpy(dtype="float64"))
+    worst = np.full(packed.shape, np.nan)
+    for j, count in enumerate(valid.sum(axis=0)):
+        if count < window:
+            continue
+        worst[window - 1:count, j] = _window_min_ratio(packed[:count, j], window) - 1
+    return _wrap(worst, frame, order, valid, squeeze)
+
+def rolling_correlation(returns, benchmark, window=60):
+    """各欄與 benchmark 的滾動相關係數，只使用兩者同時有資料的日期"""
+    frame, squeeze = _as_frame(returns)
+    x = frame.to_numpy(dtype="float64")
+    y = np.broadcast_to(
+        pd.Series(benchmark).reindex(frame.index).to_numpy(dtype="float64")[:, None], x.shape
+    )
+    both = ~np.isnan(x) & ~np.isnan(y)
+    packed_x, order, valid = _pack_columns(np.where(both, x, np.nan))
+    packed_y = np.take_along_axis(np.where(both, y, np.nan), order, axis=0)
+    _, _, cov = _sliding_comoment(packed_x, packed_y, window)
+    _, _, var_x = _sliding_comoment(packed_x, packed_x, window)
+    _, _, var_y = _sliding_comoment(packed_y, packed_y, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[~np.isfinite(corr)] = np.nan
+    return _wrap(np.clip(corr, -1, 1), frame, order, valid, squeeze)
+
+# 以下整段期間統計委派給 modules.risk（多標的矩陣版本），單一 Series 也使用同一套公式
 def cumulative_return(returns: pd.Series) -> float:
     """計算累積報酬率"""
-    return (1 + returns).prod() - 1
+    from modules import risk
+    return float(risk.cumulative_return(returns)[0])
 
 def annualized_return(returns: pd.Series, periods_per_year=252) -> float:
     """計算年化報酬率"""
-    cumulative = cumulative_return(returns)
-    n_periods = len(returns)
-    return (1 + cumulative) ** (periods_per_year / n_periods) - 1
+    from modules import risk
+    return float(risk.annualized_return(returns, periods_per_year)[0])
 
 def annualized_volatility(returns: pd.Series, periods_per_year=252) -> float:
     """計算年化波動率"""
-    return returns.std() * np.sqrt(periods_per_year)
+    from modules import risk
+    return float(risk.annualized_volatility(returns, periods_per_year)[0])
 
 def max_drawdown(returns: pd.Series) -> float:
     """計算最大回落（Maximum Drawdown）"""
-    cumulative = (1 + returns).cumprod()
-    peak = cumulative.cummax()
-    drawdown = (cumulative - peak) / peak
-    return drawdown.min()
-    
-def save_indicators_to_db(symbol, db_path="finance_data.db"):
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query(f"SELECT * FROM price_data WHERE symbol = '{symbol}' ORDER BY date", conn)
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.dropna(subset=["close"])
-
-    df_ind = compute_indicators(df)
-    df_ind["symbol"] = symbol  # 加入 symbol 欄位
-    
-    # 儲存到新資料表，避免覆蓋整體表格
-    df_ind.to_sql("price_data_indicators", conn, if_exists="append", index=False)
-    conn.close()
+    from modules import risk
+    return float(risk.max_drawdown(returns)[0])
+
+# -----------------------------------
+#   串流（逐筆）指標：每筆 O(1) 更新
+# -----------------------------------
+# 以下類別的遞推方式與 pandas rolling / ewm（pandas_ta 使用的實作）逐步相同，
+# 因此逐筆更新的結果與整批計算一致。狀態可用 to_dict / from_dict 序列化。
+
+class _OnlineBase:
+    _fields = ()
+
+    def to_dict(self):
+        return {"type": type(self).__name__, **{f: getattr(self, f) for f in self._fields}}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        for f in cls._fields:
+            value = data[f]
+            setattr(obj, f, list(value) if isinstance(value, list) else value)
+        return obj
+
+
+class OnlineMA(_OnlineBase):
+    """簡單移動平均（同 pandas rolling().mean() 的 Kahan 補償加減法，加入與移出各自保留補償項）"""
+    _fields = ("window", "values", "nobs", "sum_x", "compensation_add", "compensation_remove",
+               "neg_ct", "same_ct", "prev_value")
+
+    def __init__(self, window=20):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.neg_ct = 0
+        self.same_ct = 0
+        self.prev_value = np.nan
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["values"] = list(self.values)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = super().from_dict(data)
+        obj.values = deque(data["values"])
+        return obj
+
+    def _add(self, value):
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if np.signbit(value):
+            self.neg_ct += 1
+        self.same_ct = self.same_ct + 1 if value == self.prev_value else 1
+        self.prev_value = value
+
+    def _remove(self, value):
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if np.signbit(value):
+            self.neg_ct -= 1
+
+    def update(self, value):
+        value = float(value)
+        self.values.append(value)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(value)
+        if self.nobs < self.window:
+            return np.nan
+        result = self.sum_x / self.nobs
+        if self.same_ct >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+class _OnlineEwm(_OnlineBase):
+    """pandas ewm().mean() 的逐筆版本（支援 adjust=True / False）"""
+    _fields = ("alpha", "adjust", "min_periods", "weighted", "old_wt", "nobs")
+
+    def __init__(self, alpha, adjust=True, min_periods=0):
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self.weighted = np.nan
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, value):
+        value = float(value)
+        is_obs = value == value
+        self.nobs += is_obs
+        if self.weighted == self.weighted:
+            new_wt = 1.0 if self.adjust else self.alpha
+            self.old_wt *= 1.0 - self.alpha
+            if is_obs:
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + new_wt * value) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.0
+        elif is_obs:
+            self.weighted = value
+        return self.weighted if self.nobs >= max(self.min_periods, 1) else np.nan
+
+
+class OnlineEMA(_OnlineBase):
+    """指數移動平均（同 pandas_ta.ema：前 length 筆以 SMA 為起始值，之後 adjust=False 遞推）"""
+    _fields = ("length", "seed", "ewm")
+
+    def __init__(self, length=10):
+        self.length = length
+        self.seed = []
+        self.ewm = _OnlineEwm(2.0 / (length + 1), adjust=False)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["ewm"] = self.ewm.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = super().from_dict(data)
+        obj.ewm = _OnlineEwm.from_dict(data["ewm"])
+        return obj
+
+    def update(self, value):
+        value = float(value)
+        if self.seed is not None:
+            self.seed.append(value)
+            if len(self.seed) < self.length:
+                return np.nan
+            value = np.array(self.seed).mean()
+            self.seed = None
+        return self.ewm.update(value)
+
+
+class OnlineRSI(_OnlineBase):
+    """相對強弱指標（同 pandas_ta.rsi：漲跌幅各自以 rma = ewm(alpha=1/length) 平滑）"""
+    _fields = ("length", "prev_close", "gain", "loss")
+
+    def __init__(self, length=14):
+        self.length = length
+        self.prev_close = None
+        self.gain = _OnlineEwm(1.0 / length, adjust=True, min_periods=length)
+        self.loss = _OnlineEwm(1.0 / length, adjust=True, min_periods=length)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["gain"], data["loss"] = self.gain.to_dict(), self.loss.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = super().from_dict(data)
+        obj.gain = _OnlineEwm.from_dict(data["gain"])
+        obj.loss = _OnlineEwm.from_dict(data["loss"])
+        return obj
+
+    def update(self, close):
+        close = float(close)
+        prev, self.prev_close = self.prev_close, close
+        if prev is None:
+            return np.nan
+        diff = close - prev
+        gain = self.gain.update(diff if diff > 0 else 0.0)
+        loss = self.loss.update(diff if diff < 0 else 0.0)
+        total = gain + abs(loss)
+        return 100 * gain / total if total else np.nan
+
+
+class OnlineMACD(_OnlineBase):
+    """MACD（同 calculate_macd：fast=base、slow=base*2、signal=max(base//2, 1)），update 回傳 (macd, signal, hist)"""
+    _fields = ("fast", "slow", "signal")
+
+    def __init__(self, base_period=12):
+        self.fast = OnlineEMA(base_period)
+        self.slow = OnlineEMA(base_period * 2)
+        self.signal = OnlineEMA(max(base_period // 2, 1))
+
+    def to_dict(self):
+        return {"type": type(self).__name__, **{f: getattr(self, f).to_dict() for f in self._fields}}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        for f in cls._fields:
+            setattr(obj, f, OnlineEMA.from_dict(data[f]))
+        return obj
+
+    def update(self, close):
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        if np.isnan(slow):
+            return np.nan, np.nan, np.nan
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        return macd, signal, macd - signal
@@ -1,19 +1,77 @@
+import copy
 import os
-import matplotlib
+import threading
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from fontTools import ttLib
 from fpdf import FPDF
+from fpdf.fonts import SubsetMap
+from functools import lru_cache
 from io import BytesIO
 from matplotlib import font_manager
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.ticker import FuncFormatter
 
+FONT_PATH = os.path.join(os.path.dirname(__file__), "../fonts/msjh.ttf")
+FONT_FAMILY = "MSJH"
+
+# ----------------------
+# 報告共用資源：每個行程只解析一次字型，不修改 matplotlib 的全域設定，可同時產生多份報告
+# ----------------------
+_font_lock = threading.Lock()
+_font_template = None  # (解析好的 TTFFont, 字型檔內容)
+
+def _shared_font():
+    """第一次呼叫時以 add_font 解析 TTF（字寬表、cmap、glyph id），之後所有 PDF 共用"""
+    global _font_template
+    with _font_lock:
+        if _font_template is None:
+            template = FPDF()
+            template.add_font(FONT_FAMILY, "", FONT_PATH)
+            with open(FONT_PATH, "rb") as f:
+                data = f.read()
+            _font_template = (template.fonts[FONT_FAMILY.lower()], data)
+    return _font_template
+
 class PDF(FPDF):
     def __init__(self):
         super().__init__()
-        font_path = os.path.join(os.path.dirname(__file__), "../fonts/msjh.ttf")
-        self.add_font("MSJH", "", font_path, uni=True)
-        self.set_font("MSJH", "", 12)
+        self._register_font()
+        self.set_font(FONT_FAMILY, "", 12)
+
+    def _register_font(self):
+        """
+        複製共用的字型物件代替 add_font：唯讀的字寬表等直接沿用，
+        fontTools 字型、字元子集等每份文件各自一份（輸出時 fpdf 會就地裁切 ttfont）。
+        依賴 fpdf2 2.8 的 TTFFont 欄位，requirements.txt 固定了版本。
+        """
+        template, data = _shared_font()
+        font = copy.copy(template)
+        font.i = len(self.fonts) + 1
+        font.ttfont = ttLib.TTFont(BytesIO(data), recalcTimestamp=False, lazy=True)
+        font.biggest_size_pt = 0
+        font.missing_glyphs = []
+        font._hbfont = None
+        font.subset = SubsetMap(font)
+        self.fonts[template.fontkey] = font
+
+@lru_cache(maxsize=1)
+def chart_font():
+    """圖表用的字型設定（matplotlib 會依路徑快取實際載入的字型檔）"""
+    return font_manager.FontProperties(fname=FONT_PATH)
+
+_local = threading.local()
+
+def _chart_canvas():
+    """每個執行緒重複使用同一個 Figure 與 Agg canvas（不經過 pyplot 的全域狀態）"""
+    canvas = getattr(_local, "canvas", None)
+    if canvas is None:
+        canvas = FigureCanvasAgg(Figure(figsize=(6, 3)))  # 寬6英寸、高3英寸
+        _local.canvas = canvas
+    canvas.figure.clear()
+    return canvas
 
 def safe_str(val):
     if val is None:
@@ -40,12 +98,73 @@ def format_price(val):
     except Exception:
         return str(val)
 
-def generate_pdf_report(acc_return, annual_return, volatility, mdd, merged_zh):
-    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+# ----------------------
+# 表格
+# ----------------------
+TABLE_FONT_SIZE = 9
+TABLE_ROW_HEIGHT = 6
+MAX_CELL_CHARS = 20  # 限制欄位字串長度避免超寬
+
+def format_columns(frame):
+    """
+    整欄一次轉成字串陣列（不逐列 iterrows）：成交量取整數加千分位、價格取小數一位、匯率取小數四位。
+    回傳 {欄名: 字串陣列}，並截斷至 MAX_CELL_CHARS 字。
+    """
+    out = {}
+    for col in frame.columns:
+        kind = col.lower()
+        if kind == "volume":
+            values = pd.to_numeric(frame[col], errors="coerce")
+            texts = values.fillna(0).round().astype("int64").map("{:,}".format).to_numpy(dtype=str)
+            texts[values.isna().to_numpy()] = ""
+        elif kind.startswith("price") or kind == "exchangerate":
+            values = pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype="float64")
+            texts = np.char.mod("%.4f" if kind == "exchangerate" else "%.1f", values)
+            texts[np.isnan(values)] = ""
+        else:
+            texts = frame[col].astype(str).to_numpy(dtype=str)
+        out[col] = texts.astype(f"<U{MAX_CELL_CHARS}")
+    return out
+
+def render_table(pdf, frame, row_height=TABLE_ROW_HEIGHT, font_size=TABLE_FONT_SIZE):
+    """
+    以表格輸出整個 DataFrame，每頁重複表頭。
+    先算出每頁可放的列數再分批換頁，每頁每欄以一次 multi_cell 輸出整段文字，
+    呼叫次數為「頁數 x 欄數」而非「列數 x 欄數」。
+    """
+    columns = format_columns(frame)
+    if not columns:
+        return
+    numeric = {col: not col.lower() == "date" for col in columns}
+    width = (pdf.w - pdf.l_margin - pdf.r_margin) / len(columns)
+    bottom = pdf.h - pdf.b_margin - 1e-6
+    pdf.set_font(FONT_FAMILY, "", font_size)
+
+    start, total = 0, len(frame)
+    while start < total:
+        if pdf.get_y() + 2 * row_height > bottom:  # 至少要放得下表頭與一列
+            pdf.add_page()
+        rows = int((bottom - pdf.get_y()) // row_height) - 1
+        stop = min(start + rows, total)
+
+        for col in columns:
+            pdf.cell(width, row_height, col, border=1, align="C")
+        pdf.ln(row_height)
 
+        top = pdf.get_y()
+        for i, (col, texts) in enumerate(columns.items()):
+            pdf.set_xy(pdf.l_margin + i * width, top)
+            pdf.multi_cell(width, row_height, "\n".join(texts[start:stop]), border="LRB",
+                           align="R" if numeric[col] else "L")
+        pdf.set_xy(pdf.l_margin, top + (stop - start) * row_height)
+        start = stop
+
+    pdf.set_font(FONT_FAMILY, "", 12)
+
+def generate_pdf_report(acc_return, annual_return, volatility, mdd, merged_zh):
     pdf = PDF()
     pdf.add_page()
-    pdf.set_font("MSJH", "", 12)
+    pdf.set_font(FONT_FAMILY, "", 12)
 
     # 統計數據 - 使用 cell 寬度固定，並對齊冒號
     stats = [
@@ -60,75 +179,55 @@ def generate_pdf_report(acc_return, annual_return, volatility, mdd, merged_zh):
         pdf.cell(30, 10, f"{val:.2%}", ln=True, align="R")
 
     pdf.ln(5)
-    pdf.cell(0, 10, "近期資料（摘要）", ln=True)
-
-    # 針對每筆資料做欄位排版，建議每行兩欄，每欄寬度約80
-    for _, row in merged_zh.iterrows():
-        row_texts = []
-        for col in merged_zh.columns:
-            val = row[col]
-            if col.lower() == "volume":
-                text = format_volume(val)
-            elif col.lower() == "price_usd":
-                text = format_price(val)
-            else:
-                text = str(val)
-            # 限制欄位字串長度避免超寬
-            text = text[:20]
-            row_texts.append(f"{col}：{text}")
-
-        for i in range(0, len(row_texts), 3):
-            left = row_texts[i]
-            middle = row_texts[i+1] if i+1 < len(row_texts) else ""
-            right = row_texts[i+2] if i+2 < len(row_texts) else ""
-            pdf.cell(60, 8, left, ln=False)
-            pdf.cell(60, 8, middle, ln=False)
-            pdf.cell(60, 8, right, ln=True)
+    pdf.cell(0, 10, "價格資料", ln=True)
+    render_table(pdf, merged_zh)
+    pdf.ln(5)
 
     # ✅ 新增：繪製 Matplotlib 圖表（如價格走勢圖）
-    merged_zh["Date"] = pd.to_datetime(merged_zh["Date"])
-
-    fig, ax = plt.subplots(figsize=(6, 3))  # 寬6英寸、高3英寸
-
-    font_path = os.path.join(os.path.dirname(__file__), "../fonts/msjh.ttf")
-    my_font = font_manager.FontProperties(fname=font_path)
-    matplotlib.rcParams['font.family'] = my_font.get_name()
-
     if "Date" in merged_zh.columns and "Price_TWD" in merged_zh.columns:
-        ax.plot(merged_zh["Date"], merged_zh["Price_TWD"], linewidth=1)
-        ax.set_title("價格走勢圖（Price_TWD）", fontproperties=my_font)
-        ax.set_xlabel("日期", fontproperties=my_font)
-        ax.set_ylabel("價格（台幣）", fontproperties=my_font)
-        ax.tick_params(axis="x", rotation=45)
-        ax.grid(True)
-
-        # 格式化 y 軸價格
-        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f"${x:.1f}"))
-
-        # 設置 X 軸日期格式 - 以月為主，標籤以季度顯示
-        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=3))  # 每3個月一標
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m"))
-
-        # 把圖儲存到 BytesIO
-        buf = BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format="PNG")
-        buf.seek(0)
-
+        buf = render_price_chart(pd.to_datetime(merged_zh["Date"]), merged_zh["Price_TWD"])
 
          # 圖片前換頁判斷
         if pdf.get_y() + 80 > 270:
             pdf.add_page()
-            pdf.set_font("MSJH", "", 12)
+            pdf.set_font(FONT_FAMILY, "", 12)
             
         # 插入圖片進 PDF
         pdf.image(buf, x=10, y=pdf.get_y() + 10, w=180)
         buf.close()
-        plt.close(fig)
     else:
         if pdf.get_y() + 10 > 270:
             pdf.add_page()
-            pdf.set_font("MSJH", "", 12)
+            pdf.set_font(FONT_FAMILY, "", 12)
         pdf.cell(0, 10, "⚠️ 無法繪製價格走勢圖：缺少 'Date' 或 'Price_TWD' 欄位", ln=True)
 
     return BytesIO(pdf.output(dest="S"))
+
+def render_price_chart(dates, prices):
+    """畫價格走勢圖並回傳 PNG（BytesIO）"""
+    canvas = _chart_canvas()
+    fig = canvas.figure
+    ax = fig.add_subplot(111)
+    font = chart_font()
+
+    ax.plot(dates, prices, linewidth=1)
+    ax.set_title("價格走勢圖（Price_TWD）", fontproperties=font)
+    ax.set_xlabel("日期", fontproperties=font)
+    ax.set_ylabel("價格（台幣）", fontproperties=font)
+    ax.tick_params(axis="x", rotation=45)
+    ax.grid(True)
+
+    # 格式化 y 軸價格
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f"${x:.1f}"))
+
+    # 設置 X 軸日期格式 - 以月為主，標籤以季度顯示
+    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=3))  # 每3個月一標
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m"))
+
+    # 把圖儲存到 BytesIO
+    buf = BytesIO()
+    fig.tight_layout()
+    canvas.print_png(buf)
+    buf.seek(0)
+    fig.clear()
+    return buf
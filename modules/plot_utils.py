@@ -1,13 +1,120 @@
+import os
+
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
-def plot_price_volume(df, title="價格走勢圖"):
+# ----------------------
+# 繪圖前降採樣
+# ----------------------
+# 圖表寬度（像素）與每像素保留的點數決定目標點數：超過的資料點在螢幕上也分辨不出來，
+# 只會增加傳到瀏覽器的資料量。點數超過 WEBGL_THRESHOLD 時改用 WebGL（Scattergl）繪製。
+# 寬度由呼叫端依版面傳入；未傳入時使用 DEFAULT_WIDTH_PX（可用環境變數覆寫）。
+DEFAULT_WIDTH_PX = int(os.environ.get("FINANCE_CHART_WIDTH", 1200))
+POINTS_PER_PIXEL = 1
+WEBGL_THRESHOLD = 5000
+
+
+def target_points(width_px=None, points_per_pixel=POINTS_PER_PIXEL):
+    return max(int((width_px or DEFAULT_WIDTH_PX) * points_per_pixel), 3)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets：每個區間保留與前一個選點、下一區間平均點構成三角形面積最大的點，
+    保留走勢形狀。另外強制保留全域最高、最低點。回傳排序後的索引。
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return np.unique(np.concatenate([selected, [np.argmin(y), np.argmax(y)]]))
+
+
+def minmax_indices(y, n_out):
+    """每個區間保留最高與最低點（適合高頻震盪的序列，極值一定保留）"""
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    buckets = np.arange(n) * max(n_out // 2, 1) // n
+    grouped = pd.Series(y).groupby(buckets)
+    return np.unique(np.concatenate([grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy(), [0, n - 1]]))
+
+
+def downsample(df, x_col="date", y_col="close", n_out=None, method="lttb"):
+    """依 y_col 選出要保留的資料列（其他欄位跟著同一批列）；資料量不大時原樣回傳"""
+    n_out = n_out or target_points()
+    if len(df) <= n_out:
+        return df
+    df = df.dropna(subset=[y_col]).reset_index(drop=True)
+    x = pd.to_datetime(df[x_col]).to_numpy(dtype="datetime64[ns]").astype("int64")
+    if method == "minmax":
+        keep = minmax_indices(df[y_col], n_out)
+    else:
+        keep = lttb_indices(x, df[y_col], n_out)
+    return df.iloc[keep].reset_index(drop=True)
+
+
+def line_trace(x, y, name, n_out=None, width_px=None, **kwargs):
+    """建立折線 trace：依圖寬降採樣，點數仍多時使用 Scattergl"""
+    frame = pd.DataFrame({"x": x, "y": np.asarray(y, dtype="float64")})
+    total = len(frame)
+    frame = downsample(frame, x_col="x", y_col="y", n_out=n_out or target_points(width_px))
+    trace = go.Scattergl if total > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=frame["x"], y=frame["y"], mode="lines", name=name, **kwargs)
+
+
+def selected_x_range(event):
+    """
+    從 st.plotly_chart(on_select="rerun", selection_mode="box") 的回傳值取出框選的日期區間，
+    沒有框選時回傳 None。
+    """
+    try:
+        boxes = event["selection"]["box"]
+    except (KeyError, TypeError):
+        return None
+    if not boxes:
+        return None
+    x0, x1 = boxes[0]["x"][:2]
+    start, end = sorted([pd.Timestamp(x0), pd.Timestamp(x1)])
+    return start, end
+
+
+def plot_price_volume(df, title="價格走勢圖", n_out=None, width_px=None):
+    """
+    價格與成交量圖。資料點超過 n_out（預設依圖寬 width_px 決定）時，收盤價以 LTTB 降採樣；
+    成交量另外以每區間最高 / 最低值降採樣，量能尖峰不會因為落在價格選點之間而消失。
+    降採樣後標題會註明顯示點數。
+    """
+    total = len(df)
+    n_out = n_out or target_points(width_px)
+    prices = downsample(df, n_out=n_out)
+    if len(prices) < total:
+        title = f"{title}（顯示 {len(prices)} / {total} 點，框選區間可檢視完整資料）"
+    scatter = go.Scattergl if total > WEBGL_THRESHOLD else go.Scatter
+
     fig = go.Figure()
 
     # 收盤價折線圖
     fig.add_trace(
-        go.Scatter(
-            x=df["date"],
-            y=df["close"],
+        scatter(
+            x=prices["date"],
+            y=prices["close"],
             mode="lines",
             name="收盤價",
             line=dict(color="#1f77b4")
@@ -16,10 +123,11 @@ def plot_price_volume(df, title="價格走勢圖"):
 
     # 成交量長條圖（如有）
     if "volume" in df.columns:
+        volume = downsample(df, y_col="volume", n_out=n_out, method="minmax")
         fig.add_trace(
             go.Bar(
-                x=df["date"],
-                y=df["volume"],
+                x=volume["date"],
+                y=volume["volume"],
                 name="成交量",
                 yaxis="y2",
                 opacity=0.3,
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from modules import indicators
+from modules.indicators import _pack_columns, _unpack_columns
+
+# 統一的年化慣例：以「期數」年化（日資料一年 252 期），不使用日曆天數
+PERIODS_PER_YEAR = 252
+
+METRICS = [
+    "cumulative_return", "annualized_return", "annualized_volatility",
+    "max_drawdown", "sharpe", "sortino", "calmar",
+]
+
+METRIC_LABELS = {
+    "cumulative_return": "累積報酬率",
+    "annualized_return": "年化報酬率",
+    "annualized_volatility": "年化波動率",
+    "max_drawdown": "最大回落（MDD）",
+    "sharpe": "夏普比率",
+    "sortino": "索提諾比率",
+    "calmar": "卡瑪比率",
+}
+
+
+# ----------------------
+# 輸入整理
+# ----------------------
+def returns_from_prices(prices):
+    """
+    價格寬表（日期 x 標的）轉為簡單報酬率；各欄的休市日（NaN）略過，
+    報酬以「前一個有效價格」計算，結果與逐欄 dropna().pct_change() 相同。
+    """
+    prices = prices.to_frame() if isinstance(prices, pd.Series) else prices
+    previous = prices.ffill().shift(1)
+    return (prices / previous - 1).where(prices.notna() & previous.notna())
+
+
+def _as_matrix(returns):
+    values = np.asarray(returns, dtype="float64")
+    return values.reshape(-1, 1) if values.ndim == 1 else values
+
+
+def _safe_divide(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = a / b
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+# ----------------------
+# 整段期間統計（每欄一個值，整批向量化）
+# ----------------------
+def cumulative_return(returns):
+    r = _as_matrix(returns)
+    out = np.nanprod(1 + r, axis=0) - 1
+    out[np.isnan(r).all(axis=0)] = np.nan
+    return out
+
+
+def annualized_return(returns, periods_per_year=PERIODS_PER_YEAR):
+    r = _as_matrix(returns)
+    n = (~np.isnan(r)).sum(axis=0).astype("float64")
+    n[n == 0] = np.nan
+    return (1 + cumulative_return(r)) ** (periods_per_year / n) - 1
+
+
+def annualized_volatility(returns, periods_per_year=PERIODS_PER_YEAR):
+    r = _as_matrix(returns)
+    n = (~np.isnan(r)).sum(axis=0)
+    mean = _safe_divide(np.nansum(r, axis=0), n.astype("float64"))
+    ss = np.nansum((r - mean) ** 2, axis=0)
+    return np.sqrt(_safe_divide(ss, (n - 1).astype("float64")) * periods_per_year)
+
+
+def max_drawdown(returns):
+    """以累積淨值（起始為 1）計算最大回落；NaN 視為該期無變動"""
+    r = _as_matrix(returns)
+    wealth = np.cumprod(1 + np.nan_to_num(r), axis=0)
+    peak = np.maximum(np.maximum.accumulate(wealth, axis=0), 1.0)
+    out = (wealth / peak - 1).min(axis=0, initial=0.0)
+    out[np.isnan(r).all(axis=0)] = np.nan
+    return out
+
+
+def sharpe_ratio(returns, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """年化夏普比率；risk_free 為年化無風險利率"""
+    r = _as_matrix(returns) - risk_free / periods_per_year
+    n = (~np.isnan(r)).sum(axis=0).astype("float64")
+    excess = _safe_divide(np.nansum(r, axis=0), n) * periods_per_year
+    return _safe_divide(excess, annualized_volatility(r, periods_per_year))
+
+
+def sortino_ratio(returns, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """年化索提諾比率：只以下檔波動當作風險"""
+    r = _as_matrix(returns) - risk_free / periods_per_year
+    valid = ~np.isnan(r)
+    n = valid.sum(axis=0).astype("float64")
+    downside = np.sqrt(_safe_divide(np.nansum(np.minimum(r, 0) ** 2, axis=0), n) * periods_per_year)
+    excess = _safe_divide(np.nansum(r, axis=0), n) * periods_per_year
+    return _safe_divide(excess, downside)
+
+
+def calmar_ratio(returns, periods_per_year=PERIODS_PER_YEAR):
+    """年化報酬率 / 最大回落幅度"""
+    r = _as_matrix(returns)
+    return _safe_divide(annualized_return(r, periods_per_year), np.abs(max_drawdown(r)))
+
+
+def summarize(returns, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """
+    對報酬率矩陣（日期 x 標的）一次算出所有統計，回傳 標的 x 指標 的 DataFrame，
+    可直接 sort_values 做全標的排行。
+    """
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    r = _as_matrix(frame)
+    data = {
+        "cumulative_return": cumulative_return(r),
+        "annualized_return": annualized_return(r, periods_per_year),
+        "annualized_volatility": annualized_volatility(r, periods_per_year),
+        "max_drawdown": max_drawdown(r),
+        "sharpe": sharpe_ratio(r, risk_free, periods_per_year),
+        "sortino": sortino_ratio(r, risk_free, periods_per_year),
+        "calmar": calmar_ratio(r, periods_per_year),
+    }
+    return pd.DataFrame(data, index=getattr(frame, "columns", None), columns=METRICS)
+
+
+# ----------------------
+# 滾動視窗（以各標的自身的有效資料筆數為視窗）
+# ----------------------
+def _window_sum(packed, window):
+    csum = np.cumsum(packed, axis=0)
+    out = np.full(packed.shape, np.nan)
+    if len(packed) >= window:
+        out[window - 1:] = csum[window - 1:]
+        out[window:] -= csum[:-window]
+    return out
+
+
+def rolling_summary(returns, window=PERIODS_PER_YEAR, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """
+    滾動報酬率、年化波動率、夏普比率與最大回落，回傳 {指標: 日期 x 標的 DataFrame}。
+    波動率 / 夏普 / 回落皆使用 indicators 的滾動函式。
+    """
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    packed, order, valid = _pack_columns(_as_matrix(frame))
+    growth = np.exp(_window_sum(np.log1p(np.nan_to_num(packed)), window)) - 1
+    wealth = np.cumprod(1 + frame.fillna(0), axis=0).where(frame.notna())
+
+    return {
+        "rolling_return": pd.DataFrame(_unpack_columns(growth, order, valid), index=frame.index, columns=frame.columns),
+        "rolling_volatility": indicators.rolling_volatility(frame, window, periods_per_year),
+        "rolling_sharpe": indicators.rolling_sharpe(frame, window, risk_free, periods_per_year),
+        "rolling_max_drawdown": indicators.rolling_max_drawdown(wealth, window),
+    }
+
+
+# ----------------------
+# 相關係數 / 共變異數矩陣
+# ----------------------
+def pairwise_moments(returns, min_periods=2):
+    """
+    成對完整（pairwise-complete）的共變異數與相關係數矩陣：每一對標的只使用兩者都有資料的日期，
+    處理台 / 美 / 日休市日不一致。全部以數次矩陣乘法（BLAS）完成，結果與 DataFrame.cov() / corr() 相同。
+    回傳 (cov, corr) 兩個 標的 x 標的 DataFrame。
+    """
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    x = _as_matrix(frame)
+    mask = (~np.isnan(x)).astype("float64")
+    x0 = np.nan_to_num(x)
+
+    n = mask.T @ mask                       # 成對共同筆數
+    sum_x = x0.T @ mask                     # [i, j]：i 在 (i, j) 共同日期上的總和
+    sum_xx = (x0 ** 2).T @ mask
+    sum_xy = x0.T @ x0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sum_xy - sum_x * sum_x.T / n) / (n - 1)
+        var = (sum_xx - sum_x ** 2 / n) / (n - 1)  # [i, j]：i 在共同日期上的變異數
+        corr = cov / np.sqrt(var * var.T)
+    too_few = n < max(min_periods, 2)
+    cov[too_few] = np.nan
+    corr[too_few] = np.nan
+    corr = np.clip(corr, -1, 1)
+    np.fill_diagonal(corr, np.where(np.isnan(np.diag(cov)), np.nan, 1.0))
+
+    labels = frame.columns
+    return pd.DataFrame(cov, index=labels, columns=labels), pd.DataFrame(corr, index=labels, columns=labels)
@@ -0,0 +1,311 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# ----------------------
+# 日期編碼：price_data 等表的 date 欄位存「自 1970-01-01 起的日數」（INTEGER）
+# ----------------------
+EPOCH = date(1970, 1, 1)
+_EPOCH64 = np.datetime64("1970-01-01", "D")
+
+
+def encode_date(value):
+    """date / datetime / 'YYYY-MM-DD' 字串 → epoch 日數；None 保持 None"""
+    if value is None:
+        return None
+    return (pd.Timestamp(value).date() - EPOCH).days
+
+
+def decode_date(day):
+    """epoch 日數 → datetime.date；None 保持 None"""
+    if day is None:
+        return None
+    return EPOCH + timedelta(days=int(day))
+
+
+def encode_dates(values):
+    """整批日期 → epoch 日數 list（供 executemany）"""
+    index = pd.DatetimeIndex(values)
+    if index.tz is not None:
+        index = index.tz_localize(None)  # 以交易所當地日期為準
+    days = index.to_numpy(dtype="datetime64[D]") - _EPOCH64
+    return days.astype("int64").tolist()
+
+
+def decode_dates(days):
+    """整批 epoch 日數 → datetime64[ns] 陣列（供 DataFrame 欄位 / index）"""
+    days = np.asarray(days, dtype="int64")
+    return (_EPOCH64 + days.astype("timedelta64[D]")).astype("datetime64[ns]")
+
+
+# ----------------------
+# 最新版資料表結構
+# ----------------------
+SCHEMA_VERSION = 2
+
+# price_data 與 converted_price_data 皆為 WITHOUT ROWID 叢集表，{name} 供遷移時建立暫存表
+PRICE_DATA_DDL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        symbol_id INTEGER NOT NULL,
+        date INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        PRIMARY KEY (symbol_id, date)
+    ) WITHOUT ROWID
+"""
+
+CONVERTED_PRICE_DDL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        symbol_id INTEGER NOT NULL,
+        date INTEGER NOT NULL,
+        converted_currency TEXT NOT NULL,
+        converted_price REAL,
+        PRIMARY KEY (symbol_id, date, converted_currency)
+    ) WITHOUT ROWID
+"""
+
+TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS symbols (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT UNIQUE,
+        name TEXT,
+        type TEXT,
+        region TEXT,
+        currency TEXT
+    )
+    """,
+    PRICE_DATA_DDL.format(name="price_data"),
+    CONVERTED_PRICE_DDL.format(name="converted_price_data"),
+)
+
+
+# ----------------------
+# 版本遷移（PRAGMA user_version 記錄目前版本）
+# ----------------------
+# 1：date 由 TEXT/DATE 改為 INTEGER epoch 日數、volume 改為 INTEGER，
+#    移除與 UNIQUE(symbol_id, date) 重複的索引（idx_symbol_id、idx_date、idx_symbol_date）
+#    及與 symbols.symbol UNIQUE 重複的 idx_symbol。
+#    price_indicators / indicator_state 為衍生資料，直接刪除，讀取時會自動重算。
+MIGRATION_1 = """
+    BEGIN IMMEDIATE;
+    CREATE TABLE price_data_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol_id INTEGER NOT NULL,
+        date INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        UNIQUE(symbol_id, date)
+    );
+    INSERT INTO price_data_new (id, symbol_id, date, open, high, low, close, volume)
+    SELECT id, symbol_id,
+           CAST(ROUND(julianday(substr(date, 1, 10)) - 2440587.5) AS INTEGER),
+           open, high, low, close,
+           CAST(ROUND(volume) AS INTEGER)
+    FROM price_data;
+    DROP TABLE price_data;
+    ALTER TABLE price_data_new RENAME TO price_data;
+    DROP INDEX IF EXISTS idx_symbol;
+    DROP TABLE IF EXISTS price_indicators;
+    DROP TABLE IF EXISTS indicator_state;
+    PRAGMA user_version = 1;
+    COMMIT;
+"""
+
+# 2：price_data 改為以 (symbol_id, date) 為主鍵的 WITHOUT ROWID 表，資料列依標的、日期叢集存放，
+#    不再另外保存 rowid 與 UNIQUE 索引；區間查詢是一段連續的 B-tree 走訪。
+#    converted_price_data 原本以 price_data.id 關聯，改為以 (symbol_id, date, converted_currency) 為鍵；
+#    舊資料是以最新匯率換算的結果，不搬移，遷移完成後以日期對齊的匯率重建。
+MIGRATION_2 = f"""
+    BEGIN IMMEDIATE;
+    {PRICE_DATA_DDL.format(name="price_data_new")};
+    INSERT INTO price_data_new (symbol_id, date, open, high, low, close, volume)
+    SELECT symbol_id, date, open, high, low, close, volume FROM price_data;
+    DROP TABLE IF EXISTS converted_price_data;
+    DROP TABLE price_data;
+    ALTER TABLE price_data_new RENAME TO price_data;
+    {CONVERTED_PRICE_DDL.format(name="converted_price_data")};
+    PRAGMA user_version = 2;
+    COMMIT;
+"""
+
+MIGRATIONS = [
+    (1, "price_data.date 改為 INTEGER epoch 日數並移除重複索引", MIGRATION_1),
+    (2, "price_data / converted_price_data 改為 WITHOUT ROWID 叢集表", MIGRATION_2),
+]
+
+
+def _rebuild_converted_prices(conn):
+    from modules.fx import refresh_converted_prices  # fx 依賴 schema，延後載入避免循環匯入
+
+    try:
+        refresh_converted_prices(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# 遷移腳本完成後需要額外執行的 Python 步驟
+AFTER_MIGRATION = {2: _rebuild_converted_prices}
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _has_table(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def migrate(conn, verbose=False):
+    """
+    將資料庫升級到 SCHEMA_VERSION；全新資料庫直接建立最新結構。
+    每個版本在單一交易內完成，失敗時整批 rollback。回傳升級後的版本。
+    """
+    version = get_version(conn)
+    if version == 0 and not _has_table(conn, "price_data"):
+        for ddl in TABLES:
+            conn.execute(ddl)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        return SCHEMA_VERSION
+
+    for target, description, script in MIGRATIONS:
+        if target <= version:
+            continue
+        if verbose:
+            print(f"🔧 資料庫遷移 v{version} → v{target}：{description}")
+        try:
+            conn.executescript(script)
+        except Exception:
+            conn.rollback()
+            raise
+        if target in AFTER_MIGRATION:
+            AFTER_MIGRATION[target](conn)
+        version = target
+    return version
+
+
+def ensure_schema(conn):
+    """遷移到最新版本並補建缺少的資料表（init_db 使用）"""
+    migrate(conn, verbose=True)
+    for ddl in TABLES:
+        conn.execute(ddl)
+    conn.commit()
+
+
+# ----------------------
+# 遷移前後效能比較
+# ----------------------
+def _measure(conn, integer_dates, repeat=20, insert_rows=5000, recent_days=90):
+    symbol_ids = [row[0] for row in conn.execute("SELECT DISTINCT symbol_id FROM price_data").fetchall()]
+    low, high = conn.execute("SELECT MIN(date), MAX(date) FROM price_data").fetchone()
+    low_day, high_day = (low, high) if integer_dates else (encode_date(low), encode_date(high))
+
+    def as_param(day):
+        return day if integer_dates else decode_date(day).isoformat()
+
+    query = """
+        SELECT date, open, high, low, close, volume FROM price_data
+        WHERE symbol_id = ? AND date BETWEEN ? AND ? ORDER BY date
+    """
+
+    def read_ms(start_day):
+        began = time.perf_counter()
+        for _ in range(repeat):
+            for symbol_id in symbol_ids:
+                df = pd.read_sql_query(query, conn, params=[symbol_id, as_param(start_day), as_param(high_day)])
+                df["date"] = decode_dates(df["date"]) if integer_dates else pd.to_datetime(df["date"])
+        return (time.perf_counter() - began) / repeat * 1000
+
+    result = {
+        "read_full_range_ms": read_ms(low_day),
+        f"read_last_{recent_days}_days_ms": read_ms(high_day - recent_days),
+    }
+
+    # 寫入：在交易內插入一批合成資料後 rollback，不改動資料
+    rows = [(-1, as_param(high_day + 1 + i), 1.0, 1.0, 1.0, 1.0, 0) for i in range(insert_rows)]
+    began = time.perf_counter()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO price_data (symbol_id, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    result[f"insert_{insert_rows}_rows_ms"] = (time.perf_counter() - began) * 1000
+    conn.rollback()
+
+    result["price_data_btrees"] = 1 + conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'price_data'"
+    ).fetchone()[0]
+    return result
+
+
+def _snapshot(conn, integer_dates):
+    rows = conn.execute("SELECT symbol_id, date, close, volume FROM price_data ORDER BY symbol_id, date").fetchall()
+    if integer_dates:
+        return [(symbol_id, decode_date(day), close, volume) for symbol_id, day, close, volume in rows]
+    return [(symbol_id, date.fromisoformat(str(day)[:10]), close, None if volume is None else round(volume))
+            for symbol_id, day, close, volume in rows]
+
+
+def benchmark_migration(db_path):
+    """
+    在資料庫的暫存複本上，逐一套用每個遷移版本，量測各版本的讀取 / 寫入耗時與檔案大小，
+    並確認價格資料內容在遷移後完全一致。原始資料庫不會被修改。
+    回傳 ({版本: 量測結果}, 資料是否一致)。
+    """
+    workdir = tempfile.mkdtemp()
+    try:
+        copy_path = os.path.join(workdir, "benchmark.db")
+        shutil.copyfile(db_path, copy_path)
+        conn = sqlite3.connect(copy_path, isolation_level=None)
+        version = get_version(conn)
+
+        results = {}
+        snapshot = _snapshot(conn, integer_dates=version >= 1)
+        while True:
+            conn.execute("VACUUM")
+            results[version] = _measure(conn, integer_dates=version >= 1)
+            results[version]["size_kb"] = os.path.getsize(copy_path) / 1024
+            pending = [m for m in MIGRATIONS if m[0] > version]
+            if not pending:
+                break
+            target, _, script = pending[0]
+            conn.executescript(script)
+            if target in AFTER_MIGRATION:
+                AFTER_MIGRATION[target](conn)
+            version = target
+
+        preserved = snapshot == _snapshot(conn, integer_dates=True)
+        conn.close()
+        return results, preserved
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from modules.db_pool import DB_PATH
+
+    results, preserved = benchmark_migration(DB_PATH)
+    print(f"資料保留一致：{'✅' if preserved else '❌'}")
+    metrics = list(next(iter(results.values())))
+    print("指標".ljust(28) + "".join(f"v{version}".rjust(12) for version in results))
+    for metric in metrics:
+        print(metric.ljust(28) + "".join(f"{results[version][metric]:12.2f}" for version in results))
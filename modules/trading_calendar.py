@@ -0,0 +1,50 @@
+import pandas as pd
+from datetime import datetime, time, timedelta
+
+# 各市場的時區與收盤時間；Global 標的（如 URTH）在美國掛牌，沿用美股時段
+MARKETS = {
+    "TW": ("Asia/Taipei", time(13, 30)),
+    "US": ("America/New_York", time(16, 0)),
+    "JP": ("Asia/Tokyo", time(15, 0)),
+    "Global": ("America/New_York", time(16, 0)),
+}
+
+# 固定日期的休市日 (月, 日)；農曆春節等浮動假日未列入，遇到時只會多一次空下載
+FIXED_HOLIDAYS = {
+    "TW": {(1, 1), (2, 28), (4, 4), (4, 5), (5, 1), (10, 10)},
+    "US": {(1, 1), (6, 19), (7, 4), (12, 25)},
+    "JP": {(1, 1), (1, 2), (1, 3), (2, 11), (2, 23), (4, 29), (5, 3), (5, 4), (5, 5),
+           (8, 11), (11, 3), (11, 23), (12, 31)},
+    "Global": {(1, 1), (6, 19), (7, 4), (12, 25)},
+}
+
+# 匯率全球連續交易，只有週末休市
+FX_MARKET = ("UTC", time(23, 59))
+
+
+def _market(region, symbol_type=None):
+    if symbol_type == "currency":
+        return FX_MARKET, set()
+    return MARKETS.get(region, MARKETS["US"]), FIXED_HOLIDAYS.get(region, set())
+
+
+def is_trading_day(day, region, symbol_type=None):
+    """判斷某日是否為該市場的交易日（週末與固定假日休市）"""
+    _, holidays = _market(region, symbol_type)
+    return day.weekday() < 5 and (day.month, day.day) not in holidays
+
+
+def last_closed_session(region, symbol_type=None, now=None):
+    """回傳截至 now 為止最近一個「已收盤」的交易日"""
+    (tz, close_time), _ = _market(region, symbol_type)
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    if now.tzinfo is None:
+        now = now.tz_localize(datetime.now().astimezone().tzinfo)
+    local_now = now.tz_convert(tz)
+
+    day = local_now.date()
+    if local_now.time() < close_time:
+        day -= timedelta(days=1)
+    while not is_trading_day(day, region, symbol_type):
+        day -= timedelta(days=1)
+    return day
@@ -1,21 +1,33 @@
 -- /sql/create_tables.sql
+-- 與 modules/schema.py 的最新版結構（PRAGMA user_version = 2）一致
+-- date 存「自 1970-01-01 起的日數」（INTEGER），例如 date('2024-01-01') 對應 19723
 CREATE TABLE IF NOT EXISTS symbols (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    symbol TEXT UNIQUE NOT NULL,
-    name TEXT NOT NULL,
-    type TEXT NOT NULL,
-    region TEXT NOT NULL
+    symbol TEXT UNIQUE,
+    name TEXT,
+    type TEXT,
+    region TEXT,
+    currency TEXT
 );
 
+-- price_data / converted_price_data 為 WITHOUT ROWID 叢集表，資料列依 (symbol_id, date) 排序存放
 CREATE TABLE IF NOT EXISTS price_data (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
     symbol_id INTEGER NOT NULL,
-    date TEXT NOT NULL,
+    date INTEGER NOT NULL,
     open REAL,
     high REAL,
     low REAL,
     close REAL,
     volume INTEGER,
-    UNIQUE(symbol_id, date),
-    FOREIGN KEY(symbol_id) REFERENCES symbols(id)
-);
+    PRIMARY KEY (symbol_id, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS converted_price_data (
+    symbol_id INTEGER NOT NULL,
+    date INTEGER NOT NULL,
+    converted_currency TEXT NOT NULL,
+    converted_price REAL,
+    PRIMARY KEY (symbol_id, date, converted_currency)
+) WITHOUT ROWID;
+
+PRAGMA user_version = 2;
@@ -1,3 +1,6 @@
+-- date 欄位為 epoch 日數：顯示時用 date(date * 86400, 'unixepoch')，
+-- 條件用 CAST(julianday('YYYY-MM-DD') - 2440587.5 AS INTEGER)
+
 -- 1. 檢查 symbols 表格是否存在並列出全部內容
 SELECT * FROM symbols;
 
@@ -9,11 +12,13 @@ SELECT * FROM price_data WHERE symbol = 'AAPL' ORDER BY date;
 
 -- 4. 查詢特定日期範圍的價格（範例：0050.TW 在 2024 年的資料）
 SELECT * FROM price_data 
-WHERE symbol = '0050.TW' AND date BETWEEN '2024-01-01' AND '2024-12-31'
+WHERE symbol = '0050.TW'
+  AND date BETWEEN CAST(julianday('2024-01-01') - 2440587.5 AS INTEGER)
+               AND CAST(julianday('2024-12-31') - 2440587.5 AS INTEGER)
 ORDER BY date;
 
 -- 5. 查詢某個 symbol 的最大日期（最新資料日期）
-SELECT MAX(date) FROM price_data WHERE symbol = 'AAPL';
+SELECT date(MAX(date) * 86400, 'unixepoch') FROM price_data WHERE symbol = 'AAPL';
 
 -- 6. 檢查有多少筆資料（筆數統計）
 SELECT symbol, COUNT(*) AS record_count FROM price_data GROUP BY symbol ORDER BY record_count DESC;
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from modules.indicators import compute_indicator_block
+
+MA_WINDOWS = (5, 20, 60)
+RSI_LENGTH = 14
+MACD_BASE = 12
+
+
+def _close(n=500, seed=0):
+    """隨機漫步的收盤價（恆為正）"""
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n))))
+
+
+def test_matches_pandas_ta():
+    ta = pytest.importorskip("pandas_ta")
+    close = _close()
+    names, block = compute_indicator_block(close.to_numpy(), MA_WINDOWS, RSI_LENGTH, MACD_BASE)
+
+    fast, slow, signal = MACD_BASE, MACD_BASE * 2, MACD_BASE // 2
+    macd = ta.macd(close, fast=fast, slow=slow, signal=signal)
+    expected = {f"MA{w}": ta.sma(close, length=w) for w in MA_WINDOWS}
+    expected[f"rsi{RSI_LENGTH}"] = ta.rsi(close, length=RSI_LENGTH)
+    expected["macd"] = macd[f"MACD_{fast}_{slow}_{signal}"]
+    expected["macd_signal"] = macd[f"MACDs_{fast}_{slow}_{signal}"]
+    expected["macd_hist"] = macd[f"MACDh_{fast}_{slow}_{signal}"]
+
+    for name, actual in zip(names, block.T):
+        exp = expected[name].to_numpy(dtype="float64")
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(exp), err_msg=name)
+        np.testing.assert_allclose(actual, exp, rtol=0, atol=1e-8, equal_nan=True, err_msg=name)
+
+
+def test_missing_close_is_skipped():
+    """缺值不會污染之後的指標：結果等於 dropna 後計算，缺值處為 NaN"""
+    close = _close().to_numpy()
+    gaps = close.copy()
+    gaps[[3, 70, 71, 300]] = np.nan
+    valid = ~np.isnan(gaps)
+
+    _, with_gaps = compute_indicator_block(gaps, MA_WINDOWS, RSI_LENGTH, MACD_BASE)
+    _, dropped = compute_indicator_block(gaps[valid], MA_WINDOWS, RSI_LENGTH, MACD_BASE)
+
+    assert np.isnan(with_gaps[~valid]).all()
+    np.testing.assert_array_equal(with_gaps[valid], dropped)
+
+
+def test_block_over_symbols_matches_single_columns():
+    """(日期, 標的) 的 2-D 輸入與逐欄計算一致"""
+    panel = np.column_stack([_close(seed=seed).to_numpy() for seed in range(3)])
+    panel[10, 1] = np.nan
+    _, block = compute_indicator_block(panel, MA_WINDOWS, RSI_LENGTH, MACD_BASE)
+    for j in range(panel.shape[1]):
+        _, single = compute_indicator_block(panel[:, j], MA_WINDOWS, RSI_LENGTH, MACD_BASE)
+        np.testing.assert_allclose(block[:, :, j], single, rtol=0, atol=1e-12, equal_nan=True)